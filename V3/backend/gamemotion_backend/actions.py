@@ -1,11 +1,20 @@
 # backend/gamemotion_backend/actions.py
 from __future__ import annotations
-import time, logging
+import json
+import logging
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, NamedTuple, Tuple, Optional
 
 import numpy as np
 
+from .features import FEATURE_VERSION
+from .store import open_store, PackedStore, StoreView, Row
+from .classifiers import make_classifier
+
+from .util import load_json, save_json
+
 try:
     # use your shared DATA_DIR if present
     from .util import DATA_DIR  # type: ignore
@@ -15,26 +24,205 @@ except Exception:
 log = logging.getLogger("actions")
 
 
-def _cosine(a: np.ndarray, b: np.ndarray) -> float:
-    a = a.astype(np.float32).ravel()
-    b = b.astype(np.float32).ravel()
-    denom = float(np.linalg.norm(a) * np.linalg.norm(b)) + 1e-8
-    return float(np.dot(a, b) / denom)
+class Match(NamedTuple):
+    """Top-k result for one query, best first. margin = scores[0] - scores[1] (-1 stands in for a missing runner-up)."""
+    labels: List[str]
+    scores: np.ndarray
+    margin: float
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k highest scores per row, best first. scores: (T,L)."""
+    L = scores.shape[1]
+    k = min(k, L)
+    if k < L:
+        idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.broadcast_to(np.arange(L), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, idx, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def _view_matrix(view: StoreView, temporal: bool) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Current-version rows of a store snapshot: (X, y, number of stale rows skipped)."""
+    X, y = view.column("features"), view.column("labels")
+    if temporal:
+        X = np.concatenate([X, view.column("temporal")], axis=1)
+    current = view.column("versions") == FEATURE_VERSION
+    stale = len(current) - int(current.sum())
+    if stale:
+        X, y = X[current], y[current]
+    return X, y, stale
+
+
+class CentroidIndex:
+    """
+    Per-label running sums and counts over one game's samples.
+
+    Built once from the store, then kept current by the store's append
+    listener: a new sample costs O(d) and is visible to the next match, on
+    whichever thread added it. Readers get an immutable dict that is swapped
+    on every change, so matching never takes the lock. Shared per
+    (store, temporal) through centroid_index().
+
+    The published state also holds an L2-normalised (L,d) centroid matrix, so
+    scoring a query against every label is one matrix-vector product.
+    """
+
+    def __init__(self, store: PackedStore, temporal: bool = False):
+        self.store = store
+        self.temporal = bool(temporal)
+        self._lock = threading.Lock()
+        self._sums: Dict[str, np.ndarray] = {}
+        self._counts: Dict[str, int] = {}
+        self._built_seq = 0  # last store seq in the snapshot rebuild() summed
+        self._cents: Dict[str, np.ndarray] = {}
+        self._matrix: Tuple[Tuple[str, ...], np.ndarray] = ((), np.zeros((0, 0), np.float32))
+        self.closed = False
+        self.rebuild()
+        store.add_listener(self._on_store)
+
+    def close(self) -> None:
+        """Stop following the store (the index is then frozen; see release_centroid_index)."""
+        self.closed = True
+        self.store.remove_listener(self._on_store)
+
+    def rebuild(self) -> None:
+        with self._lock:
+            view = self.store.snapshot()
+            X, y, stale = _view_matrix(view, self.temporal)
+            sums = np.zeros((len(view.label_names), X.shape[1] if X.ndim == 2 else 0), dtype=np.float64)
+            np.add.at(sums, y, X)
+            counts = np.bincount(y, minlength=len(view.label_names))
+            self._sums = {n: sums[i] for i, n in enumerate(view.label_names) if counts[i]}
+            self._counts = {n: int(counts[i]) for i, n in enumerate(view.label_names) if counts[i]}
+            self._built_seq = view.seq
+            self._publish()
+        if stale:
+            log.warning("%s: skipped %d samples with an outdated feature version; "
+                        "run `python -m gamemotion_backend.reextract` to rebuild them", self.store.exe_dir.name, stale)
+        log.info("Built centroid index for %s: %s", self.store.exe_dir.name, list(self._cents.keys()))
+
+    def _publish(self) -> None:
+        self._cents = {n: (s / self._counts[n]).astype(np.float32) for n, s in self._sums.items()}
+        self._publish_matrix()
+
+    def _publish_matrix(self) -> None:
+        labels = tuple(self._cents)
+        if not labels:
+            self._matrix = ((), np.zeros((0, 0), np.float32))
+            return
+        M = np.stack([self._cents[n] for n in labels]).astype(np.float32)
+        M /= np.linalg.norm(M, axis=1, keepdims=True) + 1e-8
+        self._matrix = (labels, M)
+
+    def _on_store(self, event: str, row: Optional[Row]) -> None:
+        if event == "rewrite":
+            self.rebuild()
+            return
+        if row is None or row.version != FEATURE_VERSION:
+            return
+        vec = row.features
+        if self.temporal:
+            tmp = row.temporal if row.temporal is not None else np.zeros(3 * vec.size, np.float32)
+            vec = np.concatenate([vec, tmp])
+        self.add(row.label, vec, seq=row.seq)
+
+    def add(self, label: str, vec: np.ndarray, seq: int = 0) -> None:
+        with self._lock:
+            # appends can be notified out of order, so only the rebuild snapshot decides what is counted
+            if seq and seq <= self._built_seq:
+                return  # already part of the snapshot the index was built from
+            width = next(iter(self._sums.values())).size if self._sums else vec.size
+            if vec.size != width:
+                rebuild = True
+            else:
+                rebuild = False
+                if label in self._sums:
+                    self._sums[label] = self._sums[label] + vec
+                    self._counts[label] += 1
+                else:
+                    self._sums[label] = vec.astype(np.float64)
+                    self._counts[label] = 1
+                cents = dict(self._cents)
+                cents[label] = (self._sums[label] / self._counts[label]).astype(np.float32)
+                self._cents = cents
+                self._publish_matrix()
+        if rebuild:
+            self.rebuild()
+
+    def centroids(self) -> Dict[str, np.ndarray]:
+        return self._cents
+
+    def matrix(self) -> Tuple[Tuple[str, ...], np.ndarray]:
+        """(labels, (L,d) unit-norm centroids), consistent with each other."""
+        return self._matrix
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    @property
+    def nbytes(self) -> int:
+        cents = self._cents
+        return (sum(v.nbytes for v in self._sums.values()) + sum(v.nbytes for v in cents.values())
+                + self._matrix[1].nbytes)
+
+
+_INDEXES: Dict[Tuple[int, bool], CentroidIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def centroid_index(store: PackedStore, temporal: bool = False) -> CentroidIndex:
+    key = (id(store), bool(temporal))
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is None:
+            index = _INDEXES[key] = CentroidIndex(store, temporal=temporal)
+    return index
+
+
+def release_centroid_index(index: CentroidIndex) -> None:
+    """Drop a shared index from the registry; the next centroid_index() call rebuilds it."""
+    key = (id(index.store), index.temporal)
+    with _INDEXES_LOCK:
+        if _INDEXES.get(key) is index:
+            del _INDEXES[key]
+    index.close()
 
 
 class ActionDB:
     """
-    Disk-backed sample store:
-      data/<exe>/<action>/*.npz
-        - features: np.ndarray (angle signature)
-        - landmarks: np.ndarray (optional)
-        - image: str (path to jpg captured)
+    Per-game samples, kept in a packed store (see store.py):
+      data/<exe>/.store/
+        - features: (N,d) angle signatures
+        - labels / versions: action index and features.FEATURE_VERSION per row
+        - temporal: TemporalFeatureWindow output per row (optional)
+        - landmarks: (N,33,3) (optional)
+        - images: path to the jpg captured with each sample
+
+    With temporal=True every loaded feature vector is the angle signature
+    followed by its temporal features; samples recorded without them count as
+    a still pose (zeros).
     """
 
-    def __init__(self, base: Optional[Path] = None):
+    def __init__(self, base: Optional[Path] = None, temporal: bool = False):
         self.base: Path = Path(base) if base else Path(DATA_DIR)
-        self._centroid_cache: Dict[str, Dict[str, np.ndarray]] = {}
-        self._centroid_cache_mtime: Dict[str, float] = {}
+        self.temporal = bool(temporal)
+        self._stores: Dict[str, PackedStore] = {}
+        self._indexes: Dict[str, CentroidIndex] = {}
+
+    def store(self, exe_name: str) -> PackedStore:
+        store = self._stores.get(exe_name)
+        if store is None:
+            store = self._stores[exe_name] = open_store(self.base / exe_name)
+        return store
+
+    def index(self, exe_name: str) -> CentroidIndex:
+        index = self._indexes.get(exe_name)
+        if index is None or index.closed:
+            index = self._indexes[exe_name] = centroid_index(self.store(exe_name), temporal=self.temporal)
+        return index
 
     # ---- IO ----
     def add_sample(
@@ -44,110 +232,336 @@ class ActionDB:
         features: np.ndarray,
         image_path: str,
         landmarks: Optional[np.ndarray] = None,
+        temporal: Optional[np.ndarray] = None,
     ) -> None:
-        folder = self.base / exe_name / action
-        folder.mkdir(parents=True, exist_ok=True)
-        ts = int(time.time() * 1000)
-        np.savez_compressed(
-            folder / f"{ts}.npz",
-            features=features.astype(np.float32),
-            image=str(image_path),
-            landmarks=(landmarks.astype(np.float32) if landmarks is not None else np.zeros((0,), np.float32)),
-        )
+        self.store(exe_name).append(action, features, str(image_path), landmarks=landmarks, temporal=temporal)
+
+    def load_matrix(self, exe_name: str) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """
+        Current-version samples as (X (N,d) float32, y (N,) label index, label names).
+        X comes straight from the memory-mapped store when nothing is pending.
+        """
+        if not (self.base / exe_name).exists():
+            return np.zeros((0, 0), np.float32), np.zeros(0, np.int32), []
+        view = self.store(exe_name).snapshot()
+        X, y, _ = _view_matrix(view, self.temporal)
+        return X, y, view.label_names
 
     def load_all(self, exe_name: str) -> Dict[str, List[np.ndarray]]:
         """
         Public method expected by main.py. Returns:
           { action_label: [features_np_array, ...], ... }
         """
+        X, y, names = self.load_matrix(exe_name)
         out: Dict[str, List[np.ndarray]] = {}
-        exe_dir = self.base / exe_name
-        if not exe_dir.exists():
-            return out
-        for action_dir in exe_dir.iterdir():
-            if not action_dir.is_dir():
-                continue
-            feats: List[np.ndarray] = []
-            for f in action_dir.glob("*.npz"):
-                try:
-                    with np.load(f, allow_pickle=True) as z:
-                        feats.append(z["features"].astype(np.float32))
-                except Exception:
-                    pass
-            if feats:
-                out[action_dir.name] = feats
+        for i, name in enumerate(names):
+            rows = X[y == i]
+            if len(rows):
+                out[name] = list(rows)
         return out
 
     # Back-compat: if some code calls _load_all, keep it working
     _load_all = load_all
 
     def labels_for_game(self, exe_name: str) -> List[str]:
-        return list(self.load_all(exe_name).keys())
+        _, y, names = self.load_matrix(exe_name)
+        return [names[i] for i in np.unique(y)]
 
     # ---- centroids & matching ----
     def _centroids(self, exe_name: str) -> Dict[str, np.ndarray]:
-        """Compute or fetch cached centroids per action label."""
-        exe_dir = self.base / exe_name
-        try:
-            mtime = exe_dir.stat().st_mtime
-        except (FileNotFoundError, OSError):
-            mtime = 0.0
-        cached = self._centroid_cache.get(exe_name)
-        if cached is not None and self._centroid_cache_mtime.get(exe_name) == mtime:
-            return cached
-
-        all_feats = self.load_all(exe_name)
-        cents: Dict[str, np.ndarray] = {}
-        for label, feats in all_feats.items():
-            try:
-                stack = np.stack(feats, axis=0).astype(np.float32)
-                cents[label] = np.mean(stack, axis=0)
-            except Exception:
-                pass
-
-        self._centroid_cache[exe_name] = cents
-        self._centroid_cache_mtime[exe_name] = mtime
-        log.info("Built centroid index for %s: %s", exe_name, list(cents.keys()))
-        return cents
+        """Centroids per action label, from the shared incremental index."""
+        return self.index(exe_name).centroids()
+
+    def top_k(self, exe_name: str, feats: np.ndarray, k: int = 3) -> Match:
+        """Up to k labels by cosine similarity to their centroid, best first."""
+        labels, M = self.index(exe_name).matrix()
+        if not labels:
+            return Match([], np.zeros(0, np.float32), 0.0)
+        q = np.asarray(feats, dtype=np.float32).ravel()
+        scores = (M @ q) / (float(np.linalg.norm(q)) + 1e-8)
+        idx = _top_k(scores[None], max(k, 2))[0]
+        top = scores[idx]
+        margin = float(top[0] - (top[1] if len(top) > 1 else -1.0))
+        idx, top = idx[:k], top[:k]
+        return Match([labels[i] for i in idx], top, margin)
+
+    def top_k_batch(self, exe_name: str, queries: np.ndarray, k: int = 3) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """
+        Score a (T,d) stack of queries at once.
+        Returns (labels, idx (T,k) into labels, scores (T,k)), best first per row.
+        """
+        labels, M = self.index(exe_name).matrix()
+        Q = np.asarray(queries, dtype=np.float32)
+        if not labels:
+            return [], np.zeros((len(Q), 0), np.intp), np.zeros((len(Q), 0), np.float32)
+        scores = (Q @ M.T) / (np.linalg.norm(Q, axis=1, keepdims=True) + 1e-8)
+        idx = _top_k(scores, k)
+        return list(labels), idx, np.take_along_axis(scores, idx, axis=1)
 
     def best_match(self, exe_name: str, feats: np.ndarray) -> Tuple[Optional[str], float, float]:
         """
         Returns (best_label, best_score, second_best_score).
         If no centroids available, returns (None, 0.0, 0.0).
         """
-        cents = self._centroids(exe_name)
-        if not cents:
+        m = self.top_k(exe_name, feats, k=2)
+        if not m.labels:
             return None, 0.0, 0.0
+        second = float(m.scores[1]) if len(m.scores) > 1 else -1.0
+        return m.labels[0], float(m.scores[0]), second
 
-        best_label: Optional[str] = None
-        best = -1.0
-        second = -1.0
-        for lbl, c in cents.items():
-            s = _cosine(feats, c)
-            if s > best:
-                second = best
-                best = s
-                best_label = lbl
-            elif s > second:
-                second = s
-        return best_label, float(best), float(second)
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the centroid indexes this DB has opened."""
+        return sum(index.nbytes for index in list(self._indexes.values()))
+
+    def close(self) -> None:
+        """Release this DB's shared centroid indexes."""
+        indexes, self._indexes = self._indexes, {}
+        for index in indexes.values():
+            release_centroid_index(index)
 
 
 class ActionRecognizer:
-    def __init__(self, exe_name: str, offline_threshold: float = 0.9):
+    """
+    Classifies live features for one game. backend="centroid" matches against
+    the shared incremental centroid index; other backends (see classifiers.py)
+    are fitted on the game's samples and refitted in the background when the
+    store changes, serving the previous fit meanwhile.
+    """
+
+    def __init__(self, exe_name: str, offline_threshold: float = 0.9, temporal: bool = False,
+                 backend: str = "centroid", backend_opts: Optional[dict] = None):
         self.exe_name = exe_name
-        self.db = ActionDB()
+        self.db = ActionDB(temporal=temporal)
         self.offline_threshold = float(offline_threshold)
+        self._backend_spec = (backend, dict(backend_opts or {}))
+        self.backend = make_classifier(backend, **self._backend_spec[1])
+        self._fitted_rev = -1
+        self._fitting = threading.Lock()
+        self._thresholds: Tuple[tuple, Dict[str, float]] = ((), {})
+        if self.backend is not None:
+            self._fit()
+        else:
+            self.db.index(exe_name)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held for this game: the fitted model, or the centroid index."""
+        if self.backend is not None:
+            return self.backend.nbytes
+        return self.db.nbytes
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _fit(self) -> None:
+        if not self._fitting.acquire(blocking=False):
+            return
+        try:
+            rev = self.db.store(self.exe_name).revision
+            X, y, names = self.db.load_matrix(self.exe_name)
+            if len(X):
+                # fit a fresh model and swap it in; the live loop keeps using the old one meanwhile
+                name, opts = self._backend_spec
+                self.backend = make_classifier(name, **opts).fit(X, y, names)
+            self._fitted_rev = rev
+        except Exception:
+            log.exception("Fitting %s classifier for %s failed", self.backend.name, self.exe_name)
+        finally:
+            self._fitting.release()
+
+    def _refresh(self) -> None:
+        if self.db.store(self.exe_name).revision != self._fitted_rev and not self._fitting.locked():
+            threading.Thread(target=self._fit, name="classifier-fit", daemon=True).start()
 
     def classify_offline(self, feats: np.ndarray) -> Tuple[Optional[str], float, float]:
         """
         Returns (label|None, best_score, second_best).
         Applies the offline_threshold only in main.py when deciding to fire.
         """
+        if self.backend is not None:
+            self._refresh()
+            return self.backend.classify(feats)
         label, best, second = self.db.best_match(self.exe_name, feats)
         if label is None:
             return None, 0.0, 0.0
         return label, float(best), float(second)
 
+    def top_k(self, feats: np.ndarray, k: int = 3) -> Match:
+        return self.db.top_k(self.exe_name, feats, k)
+
+    def classify_batch(self, feats: np.ndarray) -> List[Tuple[Optional[str], float, float]]:
+        """classify_offline for a (T,d) stack of frames in one matrix product."""
+        if self.backend is not None:
+            self._refresh()
+            return self.backend.classify_batch(feats)
+        labels, idx, scores = self.db.top_k_batch(self.exe_name, feats, k=2)
+        if not labels:
+            return [(None, 0.0, 0.0)] * len(feats)
+        second = scores[:, 1] if scores.shape[1] > 1 else np.full(len(scores), -1.0, np.float32)
+        return [(labels[i], float(b), float(s2)) for i, b, s2 in zip(idx[:, 0], scores[:, 0], second)]
+
     def candidate_labels(self) -> List[str]:
         return self.db.labels_for_game(self.exe_name)
+
+    def label_thresholds(self, quantile: float = 0.9, min_samples: int = 10, per_label: int = 200,
+                         chunk: int = 512) -> Dict[str, float]:
+        """
+        Per-label score floors learned from the stored samples: up to
+        `per_label` of each label's own samples are classified, and the floor
+        is the score that `quantile` of the correctly classified ones reach.
+        Labels with fewer than `min_samples` such samples get none. Cached
+        until the store changes or the classifier is refitted.
+        """
+        key = (self.db.store(self.exe_name).revision, self._fitted_rev, float(quantile), int(min_samples))
+        if self._thresholds[0] == key:
+            return self._thresholds[1]
+        X, y, names = self.db.load_matrix(self.exe_name)
+        rng = np.random.default_rng(0)
+        rows = []
+        for i in np.unique(y):
+            idx = np.flatnonzero(y == i)
+            rows.append(rng.choice(idx, per_label, replace=False) if len(idx) > per_label else idx)
+        rows = np.sort(np.concatenate(rows)) if rows else np.zeros(0, np.intp)
+        own: Dict[str, List[float]] = {}
+        for i in range(0, len(rows), chunk):
+            part = rows[i:i + chunk]
+            for (label, best, _), yi in zip(self.classify_batch(X[part]), y[part]):
+                if label == names[yi]:
+                    own.setdefault(label, []).append(best)
+        out = {lbl: float(np.quantile(sc, 1.0 - quantile)) for lbl, sc in own.items() if len(sc) >= min_samples}
+        self._thresholds = (key, out)
+        return out
+
+
+class RecognizerCache:
+    """
+    Shared LRU of ActionRecognizers, one per (game, temporal, backend, options),
+    bounded by their estimated memory (`max_bytes`) and count (`max_items`).
+    The most recently used recognizer is never evicted. Games with samples are
+    remembered most-recent-first in `recent_path`, so the next start can warm
+    them with prefetch().
+    """
+
+    def __init__(self, max_bytes: int = 256 << 20, max_items: int = 32, recent_path: Optional[Path] = None,
+                 keep_recent: int = 8):
+        self.max_bytes = int(max_bytes)
+        self.max_items = max(1, int(max_items))
+        self.recent_path = Path(recent_path) if recent_path else Path(DATA_DIR) / "recent_games.json"
+        self.keep_recent = int(keep_recent)
+        self._recent: Optional[List[str]] = None
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[tuple, ActionRecognizer]" = OrderedDict()
+        self._building: Dict[tuple, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(exe_name: str, temporal: bool, backend: str, backend_opts: Optional[dict]) -> tuple:
+        return exe_name, bool(temporal), backend or "centroid", json.dumps(backend_opts or {}, sort_keys=True)
+
+    def get(self, exe_name: str, offline_threshold: float = 0.9, temporal: bool = False,
+            backend: str = "centroid", backend_opts: Optional[dict] = None) -> ActionRecognizer:
+        key = self._key(exe_name, temporal, backend, backend_opts)
+        rec = self._lookup(key)
+        if rec is not None:
+            self.hits += 1
+        else:
+            rec, built = self._build(key, touch=True)
+            if built:
+                self.misses += 1
+            else:
+                self.hits += 1  # a prefetch finished it while we waited
+        rec.offline_threshold = float(offline_threshold)
+        if (rec.db.base / exe_name).is_dir():
+            self._touch_recent(exe_name)
+        return rec
+
+    def prefetch(self, exe_names: List[str], temporal: bool = False, backend: str = "centroid",
+                 backend_opts: Optional[dict] = None) -> threading.Thread:
+        """Build recognizers for `exe_names` on a background thread, most important first."""
+        def run():
+            for exe in exe_names:
+                try:
+                    _, built = self._build(self._key(exe, temporal, backend, backend_opts), touch=False)
+                    if built:
+                        log.info("Prefetched recognizer for %s", exe)
+                except Exception:
+                    log.exception("Prefetching recognizer for %s failed", exe)
+
+        t = threading.Thread(target=run, name="recognizer-prefetch", daemon=True)
+        t.start()
+        return t
+
+    def _build(self, key: tuple, touch: bool) -> Tuple[ActionRecognizer, bool]:
+        with self._lock:
+            building = self._building.setdefault(key, threading.Lock())
+        try:
+            with building:  # one build per key; a concurrent get() waits for it
+                rec = self._lookup(key, touch=touch)
+                if rec is not None:
+                    return rec, False
+                exe_name, temporal, backend, opts = key
+                rec = ActionRecognizer(exe_name, temporal=temporal, backend=backend, backend_opts=json.loads(opts))
+                self._insert(key, rec, touch=touch)
+                return rec, True
+        finally:
+            with self._lock:
+                self._building.pop(key, None)
+
+    def recent(self, n: Optional[int] = None) -> List[str]:
+        if self._recent is None:
+            names = load_json(self.recent_path, default=[]) or []
+            self._recent = [x for x in names if isinstance(x, str)]
+        return self._recent[:n]
+
+    def nbytes(self) -> int:
+        with self._lock:
+            recs = list(self._items.values())
+        return sum(r.nbytes for r in recs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            games = [k[0] for k in self._items]
+        return {"games": games, "bytes": self.nbytes(), "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+    def _lookup(self, key: tuple, touch: bool = True) -> Optional[ActionRecognizer]:
+        with self._lock:
+            rec = self._items.get(key)
+            if rec is not None and touch:
+                self._items.move_to_end(key)
+            return rec
+
+    def _insert(self, key: tuple, rec: ActionRecognizer, touch: bool = True) -> None:
+        with self._lock:
+            self._items[key] = rec
+            if not touch:
+                self._items.move_to_end(key, last=False)  # prefetched: first in line for eviction until used
+            items = list(self._items.items())
+        # sizes are measured outside the lock; fitted models only change by swapping
+        sizes = {k: r.nbytes for k, r in items}
+        total = sum(sizes.values())
+        evicted = []
+        with self._lock:
+            mru = next(reversed(self._items))
+            for k in list(self._items):
+                if total <= self.max_bytes and len(self._items) <= self.max_items:
+                    break
+                if k == mru or (touch and k == key):
+                    continue
+                total -= sizes.get(k, 0)
+                evicted.append(self._items.pop(k))
+        for r in evicted:
+            log.info("Evicted recognizer for %s (%.1f MB cached)", r.exe_name, total / 1e6)
+            r.close()
+
+    def _touch_recent(self, exe_name: str) -> None:
+        names = self.recent()
+        if names[:1] == [exe_name]:
+            return
+        self._recent = names = ([exe_name] + [x for x in names if x != exe_name])[:self.keep_recent]
+        try:
+            save_json(self.recent_path, names)
+        except OSError:
+            log.warning("Could not write %s", self.recent_path)
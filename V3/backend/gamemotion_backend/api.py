@@ -1,8 +1,13 @@
-from fastapi import FastAPI, Body, Response
+from fastapi import FastAPI, Body, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
-import time
+from typing import Optional, Dict, Any, List, Tuple
+import time, asyncio, struct, threading, uuid
+
+from .metrics import METRICS
+from .tracing import TRACER, profile_for
+from .util import LOGS_DIR
 
 app = FastAPI(title="GameMotion Backend API", version="1.0.0")
 
@@ -23,9 +28,13 @@ RUNTIME: Dict[str, Any] = {
     "key_sender": None,
     "profile_manager": None,
     "latest_jpeg": b"",
+    "latest_jpeg_seq": 0,
+    "preview_requested_at": 0.0,  # time.monotonic() of the last preview poll
     "stable": 0,
     "last_conf": 0.0,
     "cooldown_left": 0.0,
+    "pipeline": None,
+    "reextract_job": None,
 }
 
 LATEST_SETTINGS: Dict[str, Any] = {}
@@ -54,12 +63,25 @@ def telemetry():
         "online": True,
         "armed": bool(RUNTIME.get("detect_enabled", True)),
         "stable": int(RUNTIME.get("stable", 0)),
+        "frames_needed": RUNTIME.get("frames_needed"),  # frames the current label still needs to agree; None = below its floor
         "confidence": float(RUNTIME.get("last_conf", 0.0)),
         "cooldown": float(RUNTIME.get("cooldown_left", 0.0)),
         "exe": RUNTIME.get("active_exe"),
         "profile": RUNTIME.get("active_profile"),
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text format: per-stage and capture-to-keypress latency summaries."""
+    text = METRICS.render_prometheus()
+    pipe = RUNTIME.get("pipeline")
+    if pipe is not None:
+        stats = pipe.stats()
+        text += "# HELP gamemotion_stage_dropped_total Items dropped by a stage's back-pressure policy\n"
+        text += "# TYPE gamemotion_stage_dropped_total counter\n"
+        text += "".join(f'gamemotion_stage_dropped_total{{stage="{n}"}} {st["dropped"]}\n' for n, st in stats.items())
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
 # ---- Detect controls ----
 @app.post("/detect/start")
 def detect_start():
@@ -70,6 +92,9 @@ def detect_start():
 @app.post("/detect/stop")
 def detect_stop():
     RUNTIME["detect_enabled"] = False
+    ks = RUNTIME.get("key_sender")
+    if ks is not None:
+        ks.cancel_all()  # drop queued macros and let go of held keys
     append_log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} [INFO] api: detect stop")
     return {"stopped": True}
 
@@ -79,6 +104,7 @@ class TrainPayload(BaseModel):
     action: str
     samples: int
     preview: Optional[bool] = True
+    sequence_frames: Optional[int] = 0  # >0: record motion templates of this many frames instead
 
 @app.post("/train/start")
 def train_start(payload: TrainPayload):
@@ -107,7 +133,12 @@ def get_profile(exe_name: str):
 def save_profile(exe_name: str, profile: Dict[str, Any] = Body(...)):
     profman.save_profile(exe_name, profile)
     append_log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} [INFO] api: saved profile {exe_name}")
-    return {"saved": True}
+    ks = RUNTIME.get("key_sender")
+    if ks is None:
+        return {"saved": True}
+    # actions whose keys the input backend cannot send (they stay disabled)
+    compiled = {action: ks.compile(mapping) for action, mapping in (profile.get("actions") or {}).items()}
+    return {"saved": True, "errors": {a: list(m.errors) for a, m in compiled.items() if not m.ok}}
 
 class TriggerBody(BaseModel):
     action: str
@@ -121,7 +152,10 @@ def trigger_action(exe_name: str, body: TriggerBody):
     mapping = prof.get("actions", {}).get(body.action)
     if not mapping:
         return {"ok": False, "error": f"No mapping for action {body.action}"}
-    ks.run_macro(mapping)
+    macro = ks.compile(mapping)
+    if not macro.ok:
+        return {"ok": False, "error": "; ".join(macro.errors)}
+    ks.run_macro(macro)
     return {"ok": True}
 
 # ---- Settings & logs ----
@@ -140,8 +174,120 @@ def set_settings(settings: Dict[str, Any] = Body(...)):
 def tail_logs(tail: int = 500):
     return {"lines": LATEST_LOG_LINES[-tail:]}
 
+# ---- Diagnostics ----
+class ProfilePayload(BaseModel):
+    seconds: float = 5.0
+    interval_ms: float = 5.0
+
+@app.post("/debug/profile")
+def debug_profile(payload: ProfilePayload = Body(default=ProfilePayload())):
+    """Sample all threads' stacks for N seconds (max 60); returns the top frames and the collapsed-stack file."""
+    seconds = max(0.1, min(float(payload.seconds), 60.0))
+    append_log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} [INFO] api: profiling for {seconds:.1f}s")
+    try:
+        return profile_for(seconds, LOGS_DIR, interval=max(1.0, payload.interval_ms) / 1000.0)
+    except RuntimeError as e:
+        return {"ok": False, "error": str(e)}
+
+@app.get("/debug/trace")
+def debug_trace():
+    """Chrome trace-event JSON of the spans recorded so far (requires --trace or --profile)."""
+    if not TRACER.enabled:
+        return {"ok": False, "error": "tracing is off; start with --trace or --profile"}
+    return TRACER.export()
+
+# ---- Feature maintenance ----
+class ReextractPayload(BaseModel):
+    all: bool = False          # also rebuild samples already at the current feature version
+    workers: Optional[int] = None
+
+@app.post("/features/reextract")
+def features_reextract(payload: ReextractPayload = Body(default=ReextractPayload())):
+    """Rebuild stored sample features from their landmarks in a background process pool."""
+    from .reextract import ReextractJob
+    job = RUNTIME.get("reextract_job")
+    if job is not None and job.running:
+        return {"ok": False, "error": "re-extraction is already running", **job.status()}
+    job = ReextractJob(workers=payload.workers, stale_only=not payload.all).start()
+    RUNTIME["reextract_job"] = job
+    append_log(f"{time.strftime('%Y-%m-%d %H:%M:%S')} [INFO] api: feature re-extraction started")
+    return {"ok": True, **job.status()}
+
+@app.get("/features/reextract")
+def features_reextract_status():
+    job = RUNTIME.get("reextract_job")
+    if job is None:
+        return {"ok": True, "state": "idle"}
+    return {"ok": True, **job.status()}
+
 # ---- Camera Preview (JPEG) ----
+_preview_cond = threading.Condition()
+# latest_jpeg_seq restarts at 0 with the process; the ETag carries this so old cached tags never match
+BOOT_ID = uuid.uuid4().hex[:12]
+
+def publish_preview(jpeg: bytes):
+    """Store a freshly encoded preview frame and wake any streaming clients."""
+    with _preview_cond:
+        RUNTIME["latest_jpeg"] = jpeg
+        RUNTIME["latest_jpeg_seq"] = RUNTIME.get("latest_jpeg_seq", 0) + 1
+        _preview_cond.notify_all()
+
+def _touch_preview():
+    # keeps the (lazy) preview encoder running while someone is watching
+    RUNTIME["preview_requested_at"] = time.monotonic()
+
+def _wait_preview(after_seq: int, timeout: float) -> Tuple[int, bytes]:
+    with _preview_cond:
+        _preview_cond.wait_for(lambda: RUNTIME.get("latest_jpeg_seq", 0) > after_seq, timeout=timeout)
+        return RUNTIME.get("latest_jpeg_seq", 0), RUNTIME.get("latest_jpeg", b"")
+
+async def _next_preview(after_seq: int) -> Tuple[int, bytes]:
+    """Wait (off the event loop) until a frame newer than after_seq exists."""
+    while True:
+        _touch_preview()
+        seq, data = await asyncio.to_thread(_wait_preview, after_seq, 0.5)
+        if seq > after_seq and data:
+            return seq, data
+
 @app.get("/preview.jpg")
-def preview_jpg():
+def preview_jpg(request: Request):
+    _touch_preview()
+    seq = RUNTIME.get("latest_jpeg_seq", 0)
+    etag = f'"{BOOT_ID}-{seq}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Frame-Seq": str(seq)}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
     data = RUNTIME.get("latest_jpeg", b"")
-    return Response(content=data, media_type="image/jpeg")
+    return Response(content=data, media_type="image/jpeg", headers=headers)
+
+@app.get("/preview.mjpg")
+async def preview_mjpeg():
+    """multipart/x-mixed-replace stream; each new preview frame is pushed exactly once."""
+    async def frames():
+        seq = 0
+        while True:
+            seq, data = await _next_preview(seq)
+            yield (
+                b"--frame\r\n"
+                b"Content-Type: image/jpeg\r\n"
+                + f"Content-Length: {len(data)}\r\nX-Frame-Seq: {seq}\r\n\r\n".encode()
+                + data + b"\r\n"
+            )
+
+    return StreamingResponse(
+        frames(),
+        media_type="multipart/x-mixed-replace; boundary=frame",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+@app.websocket("/ws/preview")
+async def preview_ws(ws: WebSocket):
+    """Binary frames: 8-byte big-endian sequence number followed by the JPEG bytes."""
+    await ws.accept()
+    seq = 0
+    try:
+        while True:
+            seq, data = await _next_preview(seq)
+            await ws.send_bytes(struct.pack(">Q", seq) + data)
+    except WebSocketDisconnect:
+        pass
@@ -0,0 +1,332 @@
+# gamemotion_backend/bench.py
+"""
+Microbenchmarks for the detection hot path.
+
+    python -m gamemotion_backend.bench                          # run all, print a table
+    python -m gamemotion_backend.bench --json out.json          # machine-readable results
+    python -m gamemotion_backend.bench --save-baseline          # store bench/baseline.json
+    python -m gamemotion_backend.bench --baseline bench/baseline.json --tolerance 0.25
+
+With --baseline the exit code is 1 when any benchmark's median is slower than
+the baseline by more than the tolerance, so it can gate a release build.
+Baselines are machine-specific; record one on the machine that compares against it.
+"""
+import sys
+import json
+import logging
+import time
+import types
+import pathlib
+import platform
+import argparse
+import tempfile
+import statistics
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .util import ROOT
+
+DEFAULT_BASELINE = ROOT / "bench" / "baseline.json"
+
+# name -> (setup() -> (fn, teardown|None))
+BENCHMARKS: Dict[str, Callable[[], Tuple[Callable[[], object], Optional[Callable[[], None]]]]] = {}
+
+
+def benchmark(name: str):
+    def deco(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return deco
+
+
+# ---- fixtures ----
+def _fake_landmarks(seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0.2, 0.8, size=(33, 3)).astype(np.float32)
+
+
+def _fake_results(lm: np.ndarray):
+    """Object shaped like MediaPipe results (results.pose_landmarks.landmark[i].x/y/z)."""
+    pts = [types.SimpleNamespace(x=float(x), y=float(y), z=float(z)) for x, y, z in lm]
+    return types.SimpleNamespace(pose_landmarks=types.SimpleNamespace(landmark=pts))
+
+
+def _action_db(n_labels: int, per_label: int):
+    from .actions import ActionDB
+    from .features import extract_angle_signature
+
+    tmp = tempfile.TemporaryDirectory(prefix="gm-bench-")
+    db = ActionDB(pathlib.Path(tmp.name))
+    rng = np.random.default_rng(1)
+    for i in range(n_labels):
+        base = _fake_landmarks(seed=i)
+        for _ in range(per_label):
+            lm = base + rng.normal(0, 0.01, size=base.shape).astype(np.float32)
+            db.add_sample("Bench.exe", f"ACTION_{i:03d}", extract_angle_signature(lm), "", lm)
+    db.store("Bench.exe").compact()
+    return db, tmp
+
+
+# ---- benchmarks ----
+@benchmark("features.extract_angle_signature")
+def _bench_features():
+    from .features import extract_angle_signature
+    lm = _fake_landmarks()
+    return (lambda: extract_angle_signature(lm)), None
+
+
+@benchmark("features.extract_angle_signatures[T=1000]")
+def _bench_features_batch():
+    from .features import extract_angle_signatures
+    lms = np.stack([_fake_landmarks(seed=i) for i in range(1000)])
+    return (lambda: extract_angle_signatures(lms)), None
+
+
+@benchmark("features.TemporalFeatureWindow.update")
+def _bench_temporal():
+    from .features import extract_angle_signature, TemporalFeatureWindow
+    window = TemporalFeatureWindow(size=8)
+    sig = extract_angle_signature(_fake_landmarks())
+    return (lambda: window.update(sig)), None
+
+
+@benchmark("pose.to_landmark_array")
+def _bench_to_landmark_array():
+    from .pose import PoseTracker
+    tracker = PoseTracker()
+    res = _fake_results(_fake_landmarks())
+    return (lambda: tracker.to_landmark_array(res)), None
+
+
+@benchmark("pose.draw")
+def _bench_draw():
+    from .pose import PoseTracker
+    res = _fake_results(_fake_landmarks())
+    frame = np.zeros((360, 640, 3), dtype=np.uint8)
+    return (lambda: PoseTracker.draw(frame, res)), None
+
+
+def _best_match_setup(n_labels: int):
+    def setup():
+        from .features import extract_angle_signature
+        db, tmp = _action_db(n_labels, per_label=3)
+        q = extract_angle_signature(_fake_landmarks(seed=n_labels // 2))
+        db.best_match("Bench.exe", q)  # build the index outside the timed loop
+        return (lambda: db.best_match("Bench.exe", q)), tmp.cleanup
+    return setup
+
+
+for _n in (5, 50, 500):
+    benchmark(f"actions.best_match[{_n} labels]")(_best_match_setup(_n))
+
+
+@benchmark("actions.top_k_batch[50 labels, T=1000]")
+def _bench_top_k_batch():
+    from .features import extract_angle_signatures
+    db, tmp = _action_db(50, per_label=3)
+    Q = extract_angle_signatures(np.stack([_fake_landmarks(seed=i) for i in range(1000)]))
+    db.top_k_batch("Bench.exe", Q)
+    return (lambda: db.top_k_batch("Bench.exe", Q, k=3)), tmp.cleanup
+
+
+def _classifier_setup(backend: str, n_samples: int, **opts):
+    def setup():
+        from .classifiers import make_classifier
+        rng = np.random.default_rng(2)
+        centres = rng.normal(size=(50, 12)).astype(np.float32)
+        y = rng.integers(0, 50, n_samples)
+        X = centres[y] + rng.normal(0, 0.3, size=(n_samples, 12)).astype(np.float32)
+        clf = make_classifier(backend, **opts).fit(X, y, [f"ACTION_{i:03d}" for i in range(50)])
+        q = X[0]
+        return (lambda: clf.classify(q)), None
+    return setup
+
+
+benchmark("classifiers.prototypes[50 labels x3]")(_classifier_setup("prototypes", 5000, k=3))
+benchmark("classifiers.knn[5k samples]")(_classifier_setup("knn", 5000, k=5))
+benchmark("classifiers.knn_ivf[50k samples]")(_classifier_setup("knn", 50000, k=5, ann_min_samples=20000))
+
+
+@benchmark("dtw.push[30 templates]")
+def _bench_dtw_push():
+    from .dtw import DTWMatcher, TemplateStore
+    tmp = tempfile.TemporaryDirectory(prefix="gm-bench-")
+    store = TemplateStore(pathlib.Path(tmp.name))
+    rng = np.random.default_rng(3)
+    base = rng.uniform(0.5, 2.5, size=12).astype(np.float32)
+    for i in range(10):
+        path = base + np.cumsum(rng.normal(0, 0.15, size=(30, 12)), axis=0).astype(np.float32)
+        for _ in range(3):
+            m = int(rng.integers(20, 40))
+            seq = path[np.linspace(0, 29, m).round().astype(int)]
+            store.add(f"ACTION_{i:03d}", seq + rng.normal(0, 0.05, size=seq.shape).astype(np.float32))
+    # idle frames, then one performed motion, on repeat
+    stream = np.concatenate([base + rng.normal(0, 0.05, size=(15, 12)),
+                             path + rng.normal(0, 0.05, size=path.shape)]).astype(np.float32)
+    matcher = DTWMatcher(store)
+    state = {"i": 0}
+
+    def push():
+        state["i"] += 1
+        return matcher.push(stream[state["i"] % len(stream)])
+    return push, tmp.cleanup
+
+
+@benchmark("actions.load_all[10k samples]")
+def _bench_load_all():
+    db, tmp = _action_db(n_labels=20, per_label=500)
+    return (lambda: db.load_all("Bench.exe")), tmp.cleanup
+
+
+def _fake_sender(ks_mod):
+    class _FakeKeyboard:
+        def press(self, key):
+            pass
+
+        def release(self, key):
+            pass
+
+    saved = ks_mod.pynput_keyboard, dict(ks_mod.PYNPUT_SPECIAL_KEYS)
+    ks_mod.pynput_keyboard = _FakeKeyboard()
+    for name in ("ctrl", "shift", "alt", "cmd", "space"):
+        ks_mod.PYNPUT_SPECIAL_KEYS.setdefault(name, name)  # pynput may not be installed
+    sender = ks_mod.KeySender()
+    sender._backend = "pynput"
+
+    def teardown():
+        sender.executor.stop()
+        ks_mod.pynput_keyboard = saved[0]
+        ks_mod.PYNPUT_SPECIAL_KEYS.clear()
+        ks_mod.PYNPUT_SPECIAL_KEYS.update(saved[1])
+
+    return sender, teardown
+
+
+@benchmark("key_sender.run_macro[fake backend]")
+def _bench_run_macro():
+    from . import key_sender as ks_mod
+    sender, teardown = _fake_sender(ks_mod)
+    mapping = sender.compile({"type": "keyboard", "keys": ["ctrl", "shift", "a"], "hold_ms": 0})
+    return (lambda: sender.run_macro(mapping)), teardown
+
+
+@benchmark("key_sender.submit[fake backend]")
+def _bench_submit():
+    # what the fire stage pays per action: the macro is compiled at profile load
+    # and runs on the input thread
+    from . import key_sender as ks_mod
+    sender, teardown = _fake_sender(ks_mod)
+    sender.executor.overlap = True
+    mapping = sender.compile({"type": "keyboard", "keys": ["ctrl", "shift", "a"], "hold_ms": 0})
+    return (lambda: sender.submit(mapping)), teardown
+
+
+# ---- runner ----
+def _time_case(fn: Callable[[], object], min_round_sec: float, rounds: int) -> Dict[str, float]:
+    fn()  # warm caches / lazy init
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        dt = time.perf_counter() - t0
+        if dt >= min_round_sec or number >= 1_000_000:
+            break
+        number *= 2 if dt <= 0 else max(2, int(min_round_sec / dt) + 1)
+
+    per_call: List[float] = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call.append((time.perf_counter() - t0) / number)
+    return {
+        "median_us": statistics.median(per_call) * 1e6,
+        "min_us": min(per_call) * 1e6,
+        "mean_us": statistics.fmean(per_call) * 1e6,
+        "stdev_us": (statistics.stdev(per_call) if len(per_call) > 1 else 0.0) * 1e6,
+        "rounds": rounds,
+        "iterations": number,
+    }
+
+
+def run(names: List[str], min_round_sec: float = 0.05, rounds: int = 7) -> dict:
+    results = {}
+    for name in names:
+        fn, teardown = BENCHMARKS[name]()
+        try:
+            results[name] = _time_case(fn, min_round_sec, rounds)
+        finally:
+            if teardown:
+                teardown()
+        print(f"  {name:<40} {results[name]['median_us']:>12.2f} us", file=sys.stderr)
+    return {
+        "machine": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        },
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> Tuple[List[dict], bool]:
+    rows, regressed = [], False
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            rows.append({"name": name, "status": "new", "median_us": cur["median_us"]})
+            continue
+        ratio = cur["median_us"] / max(base["median_us"], 1e-9)
+        status = "REGRESSION" if ratio > 1.0 + tolerance else ("faster" if ratio < 1.0 - tolerance else "ok")
+        regressed |= status == "REGRESSION"
+        rows.append({"name": name, "status": status, "ratio": round(ratio, 3),
+                     "median_us": cur["median_us"], "baseline_us": base["median_us"]})
+    return rows, regressed
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="GameMotion hot-path microbenchmarks")
+    ap.add_argument("-k", "--filter", type=str, default=None, help="Only run benchmarks whose name contains this")
+    ap.add_argument("--json", type=str, default=None, help="Write results as JSON to this path")
+    ap.add_argument("--baseline", type=str, default=None, help="Compare against this baseline JSON")
+    ap.add_argument("--save-baseline", nargs="?", const=str(DEFAULT_BASELINE), default=None,
+                    help=f"Store results as the baseline (default: {DEFAULT_BASELINE})")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    ap.add_argument("--rounds", type=int, default=7)
+    ap.add_argument("--min-round-sec", type=float, default=0.05)
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)  # keep per-call INFO logs out of the timings
+
+    names = [n for n in BENCHMARKS if not args.filter or args.filter in n]
+    print(f"Running {len(names)} benchmarks...", file=sys.stderr)
+    report = run(names, min_round_sec=args.min_round_sec, rounds=args.rounds)
+
+    exit_code = 0
+    if args.baseline:
+        baseline = json.loads(pathlib.Path(args.baseline).read_text(encoding="utf-8"))
+        rows, regressed = compare(report, baseline, args.tolerance)
+        report["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance, "rows": rows}
+        for r in rows:
+            ratio = f"x{r['ratio']:.2f}" if "ratio" in r else ""
+            print(f"  {r['status']:<11} {r['name']:<40} {ratio}", file=sys.stderr)
+        exit_code = 1 if regressed else 0
+
+    text = json.dumps(report, indent=2)
+    if args.json:
+        pathlib.Path(args.json).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    if args.save_baseline:
+        path = pathlib.Path(args.save_baseline)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        print(f"Baseline saved to {path}", file=sys.stderr)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# gamemotion_backend/capture.py
+import sys
+import time
+import logging
+import threading
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+from .tracing import TRACER
+
+log = logging.getLogger("capture")
+
+IS_WINDOWS = sys.platform == "win32"
+IS_MAC = sys.platform == "darwin"
+
+
+class Frame(NamedTuple):
+    """A captured camera frame plus its monotonic capture time (time.monotonic())."""
+    image: np.ndarray
+    ts: float
+    seq: int
+
+
+def open_camera(index: int, width: int, height: int, fps: Optional[float] = None, mjpg: bool = True):
+    """
+    Open a camera with the platform backend and negotiate capture settings.
+    MJPG keeps USB bandwidth low at 720p, and a 1-frame driver buffer stops
+    OpenCV from queueing frames that are stale by the time we read them.
+    Not every driver honours every property; the negotiated values are logged.
+    """
+    if IS_WINDOWS:
+        cap = cv2.VideoCapture(index, cv2.CAP_DSHOW)
+    elif IS_MAC:
+        cap = cv2.VideoCapture(index, cv2.CAP_AVFOUNDATION)
+    else:
+        cap = cv2.VideoCapture(index)  # Default backend for Linux
+
+    if mjpg:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    if fps:
+        cap.set(cv2.CAP_PROP_FPS, float(fps))
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    if cap.isOpened():
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        fourcc_str = "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)) if fourcc else "n/a"
+        log.info(
+            f"Camera negotiated: {int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))} "
+            f"@ {cap.get(cv2.CAP_PROP_FPS):.1f}fps fourcc={fourcc_str}"
+        )
+    return cap
+
+
+class FrameCapture:
+    """
+    Reads a cv2.VideoCapture on a dedicated thread into a one-slot buffer.
+
+    The newest frame always replaces the previous one ("latest frame wins"),
+    so a slow consumer skips stale frames instead of working through a backlog.
+    """
+
+    def __init__(self, cap):
+        self._cap = cap
+        self._cond = threading.Condition()
+        self._latest: Optional[Frame] = None
+        self._seq = 0
+        self._consumed_seq = 0
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while self._running:
+            with TRACER.span("capture"):
+                ok, img = self._cap.read()
+            ts = time.monotonic()
+            with self._cond:
+                if not ok:
+                    log.error("Camera read failed; stopping capture")
+                    self._running = False
+                    self._cond.notify_all()
+                    break
+                if self._latest is not None and self._latest.seq > self._consumed_seq:
+                    self.dropped += 1  # previous frame was never consumed
+                self._seq += 1
+                self._latest = Frame(img, ts, self._seq)
+                self._cond.notify_all()
+
+    def read(self, after_seq: int = 0, timeout: float = 1.0) -> Optional[Frame]:
+        """
+        Block until a frame newer than `after_seq` is available and return it.
+        Returns None when capture has stopped or nothing arrived within `timeout`.
+        """
+        with self._cond:
+            ok = self._cond.wait_for(
+                lambda: not self._running or (self._latest is not None and self._latest.seq > after_seq),
+                timeout=timeout,
+            )
+            if not ok or self._latest is None or self._latest.seq <= after_seq:
+                return None
+            self._consumed_seq = self._latest.seq
+            return self._latest
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self._cap.release()
@@ -0,0 +1,250 @@
+# gamemotion_backend/classifiers.py
+"""
+Classifier backends for ActionRecognizer.
+
+    centroid    one mean per label (the incremental CentroidIndex in actions.py; no model here)
+    prototypes  up to k spherical k-means prototypes per label; label score = best prototype
+    knn         every sample; label score = mean similarity of the label's k nearest samples
+
+All scores are cosine similarities, so `offline_threshold` means the same for
+every backend. A query is scored against all labels in one matrix product;
+`classify_batch` does a (T,d) stack at once. With many samples the kNN
+backend can search an IVF index (IVFIndex) instead of every sample.
+"""
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+log = logging.getLogger("classifiers")
+
+Result = Tuple[Optional[str], float, float]
+
+
+def _normalize(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype=np.float32)
+    return X / (np.linalg.norm(X, axis=-1, keepdims=True) + 1e-8)
+
+
+def spherical_kmeans(X: np.ndarray, k: int, iters: int = 20, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    k-means on the unit sphere (cosine similarity) with k-means++ seeding.
+    X must be L2-normalised. Returns (centres (k,d) unit-norm, assignment (n,)).
+    """
+    n = len(X)
+    if n <= k:
+        return X.copy(), np.arange(n)
+    rng = np.random.default_rng(seed)
+    centres = np.empty((k, X.shape[1]), dtype=np.float32)
+    centres[0] = X[rng.integers(n)]
+    dist = 1.0 - X @ centres[0]
+    for j in range(1, k):
+        p = np.clip(dist, 0.0, None)
+        centres[j] = X[rng.choice(n, p=p / p.sum()) if p.sum() > 0 else rng.integers(n)]
+        dist = np.minimum(dist, 1.0 - X @ centres[j])
+
+    assign = np.full(n, -1)
+    for _ in range(iters):
+        sims = X @ centres.T
+        new = sims.argmax(axis=1)
+        if np.array_equal(new, assign):
+            break
+        assign = new
+        sums = np.zeros_like(centres, dtype=np.float64)
+        np.add.at(sums, assign, X)
+        counts = np.bincount(assign, minlength=k)
+        for j in np.flatnonzero(counts == 0):
+            # empty cluster: restart it on the worst-served point
+            far = int(sims.max(axis=1).argmin())
+            sums[j] = X[far]
+            assign[far] = j
+        centres = _normalize(sums).astype(np.float32)
+    return centres, assign
+
+
+class Classifier:
+    """Interface: fit on (X, y, label names), then score queries against every label."""
+
+    name = "base"
+
+    def __init__(self):
+        self.labels: List[str] = []
+
+    @property
+    def fitted(self) -> bool:
+        return bool(self.labels)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the fitted model."""
+        total = 0
+        for v in vars(self).values():
+            if isinstance(v, np.ndarray):
+                total += v.nbytes
+            elif isinstance(v, IVFIndex):
+                total += v.nbytes
+        return total
+
+    def fit(self, X: np.ndarray, y: np.ndarray, names: List[str]) -> "Classifier":
+        raise NotImplementedError
+
+    def label_scores(self, Q: np.ndarray) -> np.ndarray:
+        """(T,d) queries -> (T,L) per-label scores."""
+        raise NotImplementedError
+
+    def classify_batch(self, Q: np.ndarray) -> List[Result]:
+        Q = np.atleast_2d(np.asarray(Q, dtype=np.float32))
+        if not self.labels:
+            return [(None, 0.0, 0.0)] * len(Q)
+        S = self.label_scores(_normalize(Q))
+        if S.shape[1] == 1:
+            return [(self.labels[0], float(s), -1.0) for s in S[:, 0]]
+        top2 = np.argpartition(-S, 1, axis=1)[:, :2]
+        s2 = np.take_along_axis(S, top2, axis=1)
+        swap = s2[:, 1] > s2[:, 0]
+        top2[swap] = top2[swap][:, ::-1]
+        s2[swap] = s2[swap][:, ::-1]
+        return [(self.labels[i], float(a), float(b)) for i, a, b in zip(top2[:, 0], s2[:, 0], s2[:, 1])]
+
+    def classify(self, q: np.ndarray) -> Result:
+        return self.classify_batch(np.asarray(q, dtype=np.float32).reshape(1, -1))[0]
+
+
+def _present(y: np.ndarray, names: List[str]) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """Sort rows by label and drop labels without samples: (order, labels, segment starts)."""
+    order = np.argsort(y, kind="stable")
+    ys = y[order]
+    ids, starts = np.unique(ys, return_index=True)
+    return order, [names[i] for i in ids], starts
+
+
+class PrototypeClassifier(Classifier):
+    """Up to `k` spherical k-means prototypes per label (e.g. left- and right-handed variants)."""
+
+    name = "prototypes"
+
+    def __init__(self, k: int = 3, iters: int = 20):
+        super().__init__()
+        self.k = max(1, int(k))
+        self.iters = int(iters)
+        self._P = np.zeros((0, 0), np.float32)
+        self._starts = np.zeros(0, np.intp)
+
+    def fit(self, X, y, names):
+        Xn = _normalize(X)
+        order, labels, starts = _present(np.asarray(y), names)
+        Xs = Xn[order]
+        bounds = list(starts) + [len(Xs)]
+        protos, proto_starts = [], []
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            centres, _ = spherical_kmeans(Xs[a:b], self.k, iters=self.iters, seed=a)
+            proto_starts.append(sum(len(p) for p in protos))
+            protos.append(centres)
+        self._P = np.concatenate(protos) if protos else np.zeros((0, Xn.shape[1] if Xn.ndim == 2 else 0), np.float32)
+        self._starts = np.asarray(proto_starts, dtype=np.intp)
+        self.labels = labels
+        log.info(f"Fitted {len(self._P)} prototypes for {len(labels)} labels")
+        return self
+
+    def label_scores(self, Q):
+        return np.maximum.reduceat(Q @ self._P.T, self._starts, axis=1)
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over unit vectors: samples are bucketed by their
+    nearest of ~sqrt(N) k-means cells, and a query only scores the samples in
+    its `nprobe` most similar cells.
+    """
+
+    def __init__(self, X: np.ndarray, nlist: Optional[int] = None, nprobe: int = 4, seed: int = 0):
+        self.X = X
+        nlist = int(nlist or max(1, np.sqrt(len(X))))
+        self.nprobe = max(1, min(int(nprobe), nlist))
+        sample = X if len(X) <= 50 * nlist else X[np.random.default_rng(seed).choice(len(X), 50 * nlist, replace=False)]
+        self.cells, _ = spherical_kmeans(sample, nlist, iters=10, seed=seed)
+        assign = (X @ self.cells.T).argmax(axis=1)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(self.cells) + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.cells))]
+
+    @property
+    def nbytes(self) -> int:
+        # X is the classifier's own matrix, counted there
+        return self.cells.nbytes + sum(lst.nbytes for lst in self.lists)
+
+    def candidates(self, q: np.ndarray) -> np.ndarray:
+        sims = self.cells @ q
+        probe = np.argpartition(-sims, self.nprobe - 1)[:self.nprobe] if self.nprobe < len(sims) else range(len(sims))
+        return np.concatenate([self.lists[c] for c in probe])
+
+
+class KNNClassifier(Classifier):
+    """
+    Exact kNN over all samples: label score = mean cosine similarity of that
+    label's k most similar samples. From `ann_min_samples` samples on, an
+    IVFIndex narrows the search first (labels missing from the probed cells score -1).
+    """
+
+    name = "knn"
+
+    def __init__(self, k: int = 5, ann_min_samples: int = 20000, nprobe: int = 4):
+        super().__init__()
+        self.k = max(1, int(k))
+        self.ann_min_samples = int(ann_min_samples)
+        self.nprobe = int(nprobe)
+        self._X = np.zeros((0, 0), np.float32)
+        self._y = np.zeros(0, np.intp)
+        self._bounds = np.zeros(1, np.intp)
+        self.ann: Optional[IVFIndex] = None
+
+    def fit(self, X, y, names):
+        order, labels, starts = _present(np.asarray(y), names)
+        self._X = _normalize(X)[order]
+        self._y = np.searchsorted(starts, np.arange(len(order)), side="right") - 1
+        # samples are sorted by label, so label j owns columns bounds[j]:bounds[j+1]
+        self._bounds = np.append(starts, len(order)).astype(np.intp)
+        self.labels = labels
+        self.ann = IVFIndex(self._X, nprobe=self.nprobe) if len(self._X) >= self.ann_min_samples > 0 else None
+        log.info(f"Fitted kNN over {len(self._X)} samples, {len(labels)} labels"
+                 f"{f' (IVF, {len(self.ann.cells)} cells)' if self.ann else ''}")
+        return self
+
+    def label_scores(self, Q):
+        if self.ann is not None:
+            return np.stack([self._ann_scores(q) for q in Q])
+        S = Q @ self._X.T
+        out = np.empty((len(Q), len(self.labels)), dtype=np.float32)
+        # top-k within each label's own slice: memory stays (T,N), however unbalanced the labels
+        for j, (a, b) in enumerate(zip(self._bounds[:-1], self._bounds[1:])):
+            seg = S[:, a:b]
+            n = b - a
+            top = np.partition(seg, n - self.k, axis=1)[:, n - self.k:] if n > self.k else seg
+            out[:, j] = top.mean(axis=1)
+        return out
+
+    def _ann_scores(self, q: np.ndarray) -> np.ndarray:
+        cand = self.ann.candidates(q)
+        s = self._X[cand] @ q
+        y = self._y[cand]
+        order = np.lexsort((-s, y))  # by label, most similar first
+        ys, ss = y[order], s[order]
+        first = np.searchsorted(ys, ys, side="left")
+        keep = (np.arange(len(ys)) - first) < self.k
+        L = len(self.labels)
+        sums = np.bincount(ys[keep], weights=ss[keep], minlength=L)
+        counts = np.bincount(ys[keep], minlength=L)
+        return np.where(counts > 0, sums / np.maximum(counts, 1), -1.0).astype(np.float32)
+
+
+BACKENDS = {"prototypes": PrototypeClassifier, "knn": KNNClassifier}
+
+
+def make_classifier(name: str, **opts) -> Optional[Classifier]:
+    """Backend by name; None for "centroid", which ActionDB serves directly."""
+    if name in (None, "", "centroid"):
+        return None
+    try:
+        return BACKENDS[name](**opts)
+    except KeyError:
+        raise ValueError(f"unknown classifier backend '{name}' (expected centroid, {', '.join(BACKENDS)})")
@@ -0,0 +1,174 @@
+# gamemotion_backend/decision.py
+from typing import Dict, Optional
+
+
+class FireDecider:
+    """
+    Firing rule shared by the live loop and offline replay.
+
+    A label fires once it has been the best match for enough consecutive
+    frames and the action cooldown has elapsed. How many frames is enough
+    depends on the evidence in the latest frame (required_frames):
+
+      min_frames     decisive: best >= fire_threshold and best - second >= 2 * decision_margin
+      frames_confirm clear:    best - second >= decision_margin, or best / second >= ratio_threshold
+                     (also a single label, where there is no runner-up to compare with)
+      max_frames     ambiguous
+
+    Frames scoring below the label's floor do not count at all. The floor is
+    `threshold`, raised per label by `label_thresholds` (learned from the
+    stored samples, see ActionRecognizer.label_thresholds) and by
+    `single_label_threshold` when only one label exists. The caller confirms
+    an actual fire with fired(), which starts the cooldown and resets the
+    stability counter.
+
+    With only frames_confirm and cooldown_sec given this is the plain
+    "same label for N frames" rule.
+    """
+
+    def __init__(self, frames_confirm: int = 4, cooldown_sec: float = 1.0,
+                 min_frames: Optional[int] = None, max_frames: Optional[int] = None,
+                 threshold: float = float("-inf"), fire_threshold: float = float("inf"),
+                 decision_margin: float = 0.0, ratio_threshold: float = float("inf"),
+                 single_label_threshold: float = float("-inf"),
+                 label_thresholds: Optional[Dict[str, float]] = None):
+        self.frames_confirm = int(frames_confirm)
+        self.cooldown_sec = float(cooldown_sec)
+        self.min_frames = max(1, int(min_frames)) if min_frames is not None else self.frames_confirm
+        self.max_frames = int(max_frames) if max_frames is not None else self.frames_confirm
+        self.threshold = float(threshold)
+        self.fire_threshold = float(fire_threshold)
+        self.decision_margin = float(decision_margin)
+        self.ratio_threshold = float(ratio_threshold)
+        self.single_label_threshold = float(single_label_threshold)
+        self.label_thresholds: Dict[str, float] = dict(label_thresholds or {})
+        self.stable_label: Optional[str] = None
+        self.stable_count = 0
+        self.required: Optional[int] = None
+        self.last_conf = 0.0
+        self.last_action_time = float("-inf")
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "FireDecider":
+        """Decider configured from settings.json (the live loop and replay share it)."""
+        frames_confirm = int(cfg.get("frames_confirm", 4))
+        return cls(
+            frames_confirm=frames_confirm,
+            cooldown_sec=float(cfg.get("action_cooldown_sec", 1.0)),
+            min_frames=int(cfg.get("min_frames_confirm", 1)),
+            max_frames=int(cfg.get("max_frames_confirm", 2 * frames_confirm)),
+            threshold=float(cfg.get("offline_threshold", 0.82)),
+            fire_threshold=float(cfg.get("fire_threshold", 0.98)),
+            decision_margin=float(cfg.get("decision_margin", 0.02)),
+            ratio_threshold=float(cfg.get("ratio_threshold", 1.03)),
+            single_label_threshold=float(cfg.get("single_label_threshold", 0.98)),
+        )
+
+    def cooldown_left(self, now: float) -> float:
+        return max(0.0, self.cooldown_sec - (now - self.last_action_time))
+
+    def floor(self, label: str, single: bool = False) -> float:
+        """Lowest score at which a frame counts towards firing `label`."""
+        floor = max(self.threshold, self.label_thresholds.get(label, float("-inf")))
+        return max(floor, self.single_label_threshold) if single else floor
+
+    def required_frames(self, label: Optional[str], best: float, second: float,
+                        calibrated: bool = True) -> Optional[int]:
+        """
+        Consecutive frames needed before `label` may fire, judged on this
+        frame's scores; None when the frame does not count. A second of -1
+        means there is no runner-up. Uncalibrated scores (e.g. DTW matches,
+        already thresholded by their matcher) skip the floors and the fast path.
+        """
+        if not label:
+            return None
+        if not calibrated:
+            return self.frames_confirm
+        single = second <= -1.0
+        if best < self.floor(label, single):
+            return None
+        if single:
+            return self.frames_confirm
+        margin = best - second
+        if margin >= 2 * self.decision_margin and best >= self.fire_threshold:
+            return self.min_frames
+        if margin >= self.decision_margin or (second > 0 and best / second >= self.ratio_threshold):
+            return self.frames_confirm
+        return self.max_frames
+
+    def update(self, label: Optional[str], best: float, second: float, now: float, armed: bool = True,
+               calibrated: bool = True) -> Optional[str]:
+        """Feed one classification; returns the label that should fire, if any."""
+        self.last_conf = float(best)
+        self.required = self.required_frames(label, best, second, calibrated)
+        if self.required is None:
+            label = None
+        # stability filter
+        if label == self.stable_label:
+            self.stable_count = min(self.stable_count + 1, 1000)
+        else:
+            self.stable_label = label
+            self.stable_count = 1
+
+        if (armed and
+            label and
+            self.stable_count >= self.required and
+            (now - self.last_action_time) >= self.cooldown_sec):
+            return label
+        return None
+
+    def fired(self, now: float) -> None:
+        self.last_action_time = now
+        self.stable_count = 0  # reset after action
+
+
+class HoldState:
+    """
+    Press/hold/release hysteresis for actions in "hold" mode.
+
+    A hold action goes down when FireDecider fires it (press) and stays down
+    while it is still the best match scoring at least its release level;
+    the first frame that fails releases it. The release level is
+    `release_threshold`, lowered to `release_margin` below the floor the
+    action was pressed at (FireDecider.floor), so any score that can press
+    also keeps the key down. A released action can only be pressed again
+    `rearm_frames` frames later, so a score hovering around the thresholds
+    does not chatter. One action is held at a time, since only the best
+    label is tracked per frame.
+    """
+
+    def __init__(self, release_threshold: float = 0.9, rearm_frames: int = 6, release_margin: float = 0.02):
+        self.release_threshold = float(release_threshold)
+        self.rearm_frames = int(rearm_frames)
+        self.release_margin = float(release_margin)
+        self.held: Optional[str] = None
+        self.payload = None
+        self.release_level = self.release_threshold
+        self._frame = 0
+        self._released_at: Dict[str, int] = {}
+
+    def can_press(self, label: str) -> bool:
+        return self.held != label and self._frame - self._released_at.get(label, -self.rearm_frames) >= self.rearm_frames
+
+    def press(self, label: str, payload=None, floor: float = float("inf")) -> None:
+        """Hold `label`; `floor` is the lowest score that could have fired it."""
+        self.held, self.payload = label, payload
+        self.release_level = min(self.release_threshold, floor - self.release_margin)
+
+    def release(self):
+        """Let go of the held action; returns (label, payload) or None when nothing was held."""
+        if self.held is None:
+            return None
+        out = (self.held, self.payload)
+        self._released_at[self.held] = self._frame
+        self.held, self.payload = None, None
+        return out
+
+    def update(self, label: Optional[str], best: float, calibrated: bool = True):
+        """Feed one frame's best match; returns release() when the held action lets go."""
+        self._frame += 1
+        if self.held is None:
+            return None
+        if label != self.held or (calibrated and best < self.release_level):
+            return self.release()
+        return None
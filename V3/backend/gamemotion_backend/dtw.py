@@ -0,0 +1,239 @@
+# gamemotion_backend/dtw.py
+"""
+Motion templates: short recorded feature sequences matched against the live
+feature stream with subsequence DTW.
+
+Templates live in data/<exe>/.templates/<action>/<ms>.npy as (m,d) float32
+angle-signature sequences (record them with POST /train/start and
+"sequence_frames": N).
+
+Matching runs backwards from the newest frame: the template's last frame is
+aligned with the current frame and the start is free within a band, so a
+gesture is recognised the moment it completes. Per frame:
+
+  1. LB_Keogh: every template's precomputed upper/lower envelope is compared
+     with the live window in one vectorised step. This gives an upper bound
+     on each template's score.
+  2. Templates whose bound is below `min_score` are skipped.
+  3. The remaining templates are aligned together. DTW uses the
+     slope-constrained step pattern {(1,1), (1,2), (2,1)}: each row depends
+     only on the two rows before it, so one row of every template is a single
+     vectorised step. The alignment stops early once two consecutive rows of
+     every template exceed the distance that `min_score` allows.
+
+Frames are z-scored per dimension over the game's templates and scaled by
+1/sqrt(2d), so the squared distance between two unrelated frames averages 1.
+A template's score is 1 - cost / path length: 1 for an exact replay, around 0
+for an unrelated motion (threshold it with `dtw_min_score`).
+"""
+import time
+import logging
+import pathlib
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+log = logging.getLogger("dtw")
+
+TEMPLATE_DIR = ".templates"
+Result = Tuple[Optional[str], float, float]
+
+
+class TemplateStore:
+    """Motion templates of one game, loaded once and kept in memory. Use open_templates()."""
+
+    def __init__(self, exe_dir: pathlib.Path):
+        self.root = pathlib.Path(exe_dir) / TEMPLATE_DIR
+        self.revision = 0
+        self._lock = threading.Lock()
+        self._templates: List[Tuple[str, np.ndarray]] = []
+        if self.root.exists():
+            for f in sorted(self.root.glob("*/*.npy")):
+                try:
+                    seq = np.load(f).astype(np.float32)
+                except Exception:
+                    log.warning(f"Skipping unreadable template {f}")
+                    continue
+                if seq.ndim == 2 and len(seq) >= 2:
+                    self._templates.append((f.parent.name, seq))
+
+    def add(self, label: str, seq: np.ndarray) -> None:
+        seq = np.asarray(seq, dtype=np.float32)
+        folder = self.root / label
+        folder.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            ts = int(time.time() * 1000)
+            path = folder / f"{ts}.npy"
+            while path.exists():
+                ts += 1
+                path = folder / f"{ts}.npy"
+            np.save(path, seq)
+            self._templates = self._templates + [(label, seq)]
+            self.revision += 1
+
+    def templates(self) -> List[Tuple[str, np.ndarray]]:
+        return self._templates
+
+
+_TEMPLATES: Dict[str, TemplateStore] = {}
+_TEMPLATES_LOCK = threading.Lock()
+
+
+def open_templates(exe_dir) -> TemplateStore:
+    key = str(pathlib.Path(exe_dir).resolve())
+    with _TEMPLATES_LOCK:
+        store = _TEMPLATES.get(key)
+        if store is None:
+            store = _TEMPLATES[key] = TemplateStore(pathlib.Path(exe_dir))
+    return store
+
+
+def _envelope(seq: np.ndarray, band: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Running max/min over +-band frames (LB_Keogh envelope)."""
+    m = len(seq)
+    pad_hi = np.concatenate([np.full((band, seq.shape[1]), -np.inf, np.float32), seq,
+                             np.full((band, seq.shape[1]), -np.inf, np.float32)])
+    pad_lo = np.where(np.isinf(pad_hi), np.inf, pad_hi)
+    win_hi = np.lib.stride_tricks.sliding_window_view(pad_hi, 2 * band + 1, axis=0)[:m]
+    win_lo = np.lib.stride_tricks.sliding_window_view(pad_lo, 2 * band + 1, axis=0)[:m]
+    return win_hi.max(axis=2), win_lo.min(axis=2)
+
+
+class DTWMatcher:
+    """
+    Streaming subsequence-DTW matcher over a TemplateStore.
+    push(feats) once per frame returns (label, best, second) like
+    ActionRecognizer.classify_offline; reset() when the body is lost.
+    """
+
+    def __init__(self, store: TemplateStore, band: float = 0.25, min_score: float = 0.5):
+        self.store = store
+        self.band = float(band)
+        self.min_score = float(min_score)
+        self._rev = -1
+        self._window = np.zeros((0, 0), np.float32)
+        self._i = 0
+        self._n = 0
+        self.evaluated = 0
+        self.pruned = 0
+        self._pack()
+
+    def _pack(self) -> None:
+        tpl = self.store.templates()
+        self._rev = self.store.revision
+        self._labels = [lbl for lbl, _ in tpl]
+        K = len(tpl)
+        if not K:
+            self._window = np.zeros((0, 0), np.float32)
+            return
+        frames = np.concatenate([seq for _, seq in tpl])
+        d = frames.shape[1]
+        self._mu = frames.mean(axis=0)
+        self._scale = 1.0 / ((frames.std(axis=0) + 1e-3) * np.sqrt(2.0 * d))
+        self._seqs = [self._transform(seq[::-1]) for _, seq in tpl]  # newest frame first
+        self._bands = [max(1, int(round(self.band * len(s)))) for s in self._seqs]
+        M = max(len(s) for s in self._seqs)
+        self._T = np.zeros((M, K, d), np.float32)  # frame-major, so one frame of every template is contiguous
+        for k, s in enumerate(self._seqs):
+            self._T[:len(s), k] = s
+        self._sq = (self._T * self._T).sum(axis=2)
+        self._U = np.zeros((K, M, d), np.float32)
+        self._L = np.zeros((K, M, d), np.float32)
+        self._lb_mask = np.zeros((K, M), bool)
+        for k, (s, b) in enumerate(zip(self._seqs, self._bands)):
+            U, L = _envelope(s, b + 1)  # slanted steps also charge one cell just outside the band
+            self._U[k, :len(s)], self._L[k, :len(s)] = U, L
+            # window frames [0, m-b) are matched on every admissible path
+            self._lb_mask[k, :max(0, len(s) - b)] = True
+        self._m = np.array([len(s) for s in self._seqs])
+        self._b = np.array(self._bands)
+        self._min_len = self._m - self._b
+        W = int((self._m + self._b).max())
+        gap = np.abs(np.arange(W)[None, None, :] - np.arange(M)[:, None, None])
+        self._band_cost = np.where(gap > self._b[None, :, None], np.inf, 0.0).astype(np.float32)  # (M, K, W)
+        if self._window.shape != (W, d):
+            self._window = np.zeros((W, d), np.float32)
+            self._i = self._n = 0
+
+    def _transform(self, X: np.ndarray) -> np.ndarray:
+        return ((np.asarray(X, dtype=np.float32) - self._mu) * self._scale).astype(np.float32)
+
+    def reset(self) -> None:
+        self._i = self._n = 0
+
+    def _recent(self) -> np.ndarray:
+        """Window frames (transformed), newest first."""
+        W = len(self._window)
+        idx = (self._i - 1 - np.arange(self._n)) % W
+        return self._transform(self._window[idx])
+
+    def push(self, feats: np.ndarray) -> Result:
+        if self.store.revision != self._rev:
+            self._pack()
+        if not self._labels:
+            return None, 0.0, 0.0
+        W = len(self._window)
+        self._window[self._i] = np.asarray(feats, dtype=np.float32).ravel()
+        self._i = (self._i + 1) % W
+        self._n = min(self._n + 1, W)
+        w = self._recent()
+        n = len(w)
+
+        # 1. LB_Keogh bound for every template at once
+        M = self._U.shape[1]
+        wp = np.zeros((M, w.shape[1]), np.float32)
+        wp[:min(n, M)] = w[:M]
+        excess = np.maximum(wp - self._U, 0.0) + np.maximum(self._L - wp, 0.0)
+        valid = self._lb_mask & (np.arange(M) < n)
+        lb = ((excess ** 2).sum(axis=2) * valid).sum(axis=1)
+        upper = 1.0 - lb / (self._m + self._b)  # best score any alignment could reach
+        upper[self._min_len > n] = -np.inf               # window still too short
+
+        # 2. skip templates that cannot reach min_score, 3. align the rest together
+        cand = np.flatnonzero(upper >= self.min_score)
+        self.evaluated += len(cand)
+        self.pruned += len(upper) - len(cand)
+        best: Dict[str, float] = {}
+        if len(cand):
+            for k, s in zip(cand, self._dtw(cand, w)):
+                lbl = self._labels[k]
+                if s > best.get(lbl, -np.inf):
+                    best[lbl] = float(s)
+        ranked = sorted(best.items(), key=lambda kv: -kv[1])
+        if not ranked or ranked[0][1] < self.min_score:
+            return None, 0.0, 0.0
+        second = ranked[1][1] if len(ranked) > 1 else -1.0
+        return ranked[0][0], ranked[0][1], second
+
+    def _dtw(self, ks: np.ndarray, w: np.ndarray) -> np.ndarray:
+        """Best subsequence-DTW score of each template in `ks` against the window (newest first)."""
+        m, b = self._m[ks], self._b[ks]
+        K, M = len(ks), int(m.max())
+        n = min(len(w), int((m + b).max()))
+        wn = w[:n]
+        # frame-major: frame i of every template is one contiguous (K, n) block
+        c = np.zeros((M + 2, K, n + 2), np.float32)
+        dots = (self._T[:M, ks].reshape(-1, w.shape[1]) @ wn.T).reshape(M, K, n)
+        c[2:, :, 2:] = np.maximum(self._sq[:M, ks, None] + (wn * wn).sum(axis=1) - 2.0 * dots, 0.0)
+        cb = c.copy()  # cell costs with the band applied, for the cell a step lands on
+        cb[2:, :, 2:] += self._band_cost[:M, ks, :n]
+        D = np.full((M + 2, K, n + 2), np.inf, np.float32)
+        D[1, :, 1] = 0.0  # virtual start before the newest frame
+        abandon = (m + b) * (1.0 - self.min_score)
+        for i in range(M):
+            r = i + 2
+            row = D[r, :, 2:]
+            np.add(D[r - 1, :, 0:n], c[r, :, 1:n + 1], out=row)                       # (1,2)
+            np.minimum(row, D[r - 2, :, 1:n + 1] + c[r - 1, :, 2:], out=row)          # (2,1)
+            np.minimum(row, D[r - 1, :, 1:n + 1], out=row)                            # (1,1)
+            row += cb[r, :, 2:]
+            # costs are non-negative: two rows over the limit keep every later row over it,
+            # so once that holds for every unfinished template none can reach min_score
+            if i % 4 == 3 and ((D[r - 1:r + 1].min(axis=(0, 2)) > abandon) | (m <= i)).all():
+                break
+        j = np.arange(n)
+        last = D[m + 1, np.arange(K), 2:]                                            # (K, n)
+        ok = (j[None, :] >= (m - 1 - b)[:, None]) & (j[None, :] < (m + b)[:, None])
+        scores = np.where(ok, 1.0 - last / np.maximum(m[:, None], j[None, :] + 1), -np.inf)
+        return scores.max(axis=1)
@@ -9,6 +9,10 @@ LH, RH = 23, 24
 LK, RK = 25, 26
 LA, RA = 27, 28
 
+# Bump whenever extract_angle_signature's output changes; stored samples carry
+# the version they were extracted with (see reextract.py).
+FEATURE_VERSION = 1
+
 def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
     """Cosine similarity between two 1D vectors."""
     a = np.asarray(a, dtype=np.float32).ravel()
@@ -17,17 +21,52 @@ def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
     nb = float(np.linalg.norm(b)) + 1e-6
     return float(np.dot(a, b) / (na * nb))
 
-def _u(v: np.ndarray) -> np.ndarray:
-    n = np.linalg.norm(v)
-    return v / (n + 1e-6)
+# Each feature is the angle between two vectors U = P[UA] - P[UB] and V = P[VA] - P[VB].
+# Two synthetic points are appended to every frame so the vertical reference is a
+# difference too: _ORIGIN = (0, 0) and _DOWN = (0, -1) (image y grows downwards).
+_ORIGIN, _DOWN = 33, 34
+_PAIRS = np.array([
+    # (UA, UB, VA, VB)
+    (LS, LE, LW, LE), (RS, RE, RW, RE),          # elbows
+    (LE, LS, LH, LS), (RE, RS, RH, RS),          # shoulders (arm raise)
+    (LH, LK, LA, LK), (RH, RK, RA, RK),          # knees
+    (LK, LH, LS, LH), (RK, RH, RS, RH),          # hips (torso/leg)
+    (RS, LS, RH, LH),                            # shoulder line vs hip line
+    (RS, LS, _DOWN, _ORIGIN), (RH, LH, _DOWN, _ORIGIN),  # lines vs vertical
+    (LS, LE, RS, RE),                            # cross-arm relation
+], dtype=np.intp)
+_UA, _UB, _VA, _VB = _PAIRS.T
+_VERTICAL_COLS = [9, 10]  # V is already a unit vector there
+_NEED = np.array([LS, RS, LE, RE, LW, RW, LH, RH, LK, RK, LA, RA], dtype=np.intp)
+_REF_POINTS = np.array([[0.0, 0.0], [0.0, -1.0]], dtype=np.float32)
+N_FEATURES = len(_PAIRS)
+
+def extract_angle_signatures(landmarks_xy: np.ndarray) -> np.ndarray:
+    """
+    Batched signature extraction.
+    landmarks_xy: (T,N,2) or (T,N,3) stack of Pose landmarks; only XY used.
+    Returns (T,12) float32. Frames missing any required body landmark get a zero row.
+    """
+    lm = np.asarray(landmarks_xy, dtype=np.float32)
+    if lm.ndim != 3 or lm.shape[2] < 2 or lm.shape[1] <= RA:
+        raise ValueError("landmarks array must have shape (T, N, >=2)")
+    T = lm.shape[0]
+    P = np.empty((T, _DOWN + 1, 2), dtype=np.float32)
+    P[:, :33] = lm[:, :33, :2]
+    P[:, 33:] = _REF_POINTS
+
+    U = P[:, _UA] - P[:, _UB]
+    V = P[:, _VA] - P[:, _VB]
+    nU = np.linalg.norm(U, axis=2) + 1e-6
+    nV = np.linalg.norm(V, axis=2) + 1e-6
+    nV[:, _VERTICAL_COLS] = 1.0
+    with np.errstate(invalid="ignore"):
+        d = np.einsum("tkj,tkj->tk", U, V) / (nU * nV)
+        out = np.arccos(np.clip(d.astype(np.float64), -1.0, 1.0)).astype(np.float32)
 
-def _ang(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> float:
-    """Angle at b formed by a-b and c-b (radians)."""
-    v1 = a - b
-    v2 = c - b
-    u1 = _u(v1); u2 = _u(v2)
-    d = float(np.clip(np.dot(u1, u2), -1.0, 1.0))
-    return np.arccos(d)
+    bad = ~np.isfinite(P[:, _NEED]).all(axis=(1, 2))
+    out[bad] = 0.0
+    return out
 
 def extract_angle_signature(landmarks_xy: np.ndarray) -> np.ndarray:
     """
@@ -38,42 +77,51 @@ def extract_angle_signature(landmarks_xy: np.ndarray) -> np.ndarray:
     lm = np.asarray(landmarks_xy, dtype=np.float32)
     if lm.ndim != 2 or lm.shape[1] < 2:
         raise ValueError("landmarks array must have shape (N, >=2)")
-    P = lm[:, :2]
-
-    need = [LS, RS, LE, RE, LW, RW, LH, RH, LK, RK, LA, RA]
-    if np.any(~np.isfinite(P[need]).reshape(-1)):
-        return np.zeros(12, dtype=np.float32)
-
-    feats = []
+    return extract_angle_signatures(lm[None])[0]
 
-    # Elbows
-    feats.append(_ang(P[LS], P[LE], P[LW]))
-    feats.append(_ang(P[RS], P[RE], P[RW]))
+class TemporalFeatureWindow:
+    """
+    Motion features over the last `size` signatures, kept in a preallocated ring buffer.
 
-    # Shoulders (arm raise)
-    feats.append(_ang(P[LE], P[LS], P[LH]))
-    feats.append(_ang(P[RE], P[RS], P[RH]))
+    update(sig) returns [velocity, acceleration, range] per angle (3*12 float32):
+      velocity     mean first difference over the window  = (x[-1] - x[0]) / (n-1)
+      acceleration mean second difference over the window = (d[-1] - d[0]) / (n-2)
+      range        max - min over the window
+    Velocity and acceleration are per frame and telescope to a few rows of the
+    buffer, so they cost the same whatever the window size.
+    """
 
-    # Knees
-    feats.append(_ang(P[LH], P[LK], P[LA]))
-    feats.append(_ang(P[RH], P[RK], P[RA]))
+    def __init__(self, size: int = 8, n_features: int = N_FEATURES):
+        self.size = max(3, int(size))
+        self._buf = np.zeros((self.size, int(n_features)), dtype=np.float32)
+        self._i = 0   # next write slot
+        self._n = 0   # valid rows
 
-    # Hips (torso/leg)
-    feats.append(_ang(P[LK], P[LH], P[LS]))
-    feats.append(_ang(P[RK], P[RH], P[RS]))
+    @property
+    def n_outputs(self) -> int:
+        return 3 * self._buf.shape[1]
 
-    # Torso relations
-    shoulder_vec = _u(P[RS] - P[LS])
-    hip_vec      = _u(P[RH] - P[LH])
-    feats.append(np.arccos(float(np.clip(np.dot(shoulder_vec, hip_vec), -1, 1))))
+    def reset(self) -> None:
+        self._i = 0
+        self._n = 0
 
-    vertical = np.array([0.0, -1.0], dtype=np.float32)
-    feats.append(np.arccos(float(np.clip(np.dot(shoulder_vec, vertical), -1, 1))))
-    feats.append(np.arccos(float(np.clip(np.dot(hip_vec, vertical), -1, 1))))
+    def _row(self, k: int) -> np.ndarray:
+        """k-th oldest valid row (0 = oldest)."""
+        return self._buf[(self._i - self._n + k) % self.size]
 
-    # Cross-arm relation
-    upper_left  = _u(P[LS] - P[LE])
-    upper_right = _u(P[RS] - P[RE])
-    feats.append(np.arccos(float(np.clip(np.dot(upper_left, upper_right), -1, 1))))
+    def update(self, sig: np.ndarray) -> np.ndarray:
+        self._buf[self._i] = sig
+        self._i = (self._i + 1) % self.size
+        if self._n < self.size:
+            self._n += 1
+        n, F = self._n, self._buf.shape[1]
 
-    return np.asarray(feats, dtype=np.float32)
+        out = np.zeros(3 * F, dtype=np.float32)
+        if n >= 2:
+            first, second, last, prev = self._row(0), self._row(1), self._row(n - 1), self._row(n - 2)
+            out[:F] = (last - first) / (n - 1)
+            if n >= 3:
+                out[F:2 * F] = ((last - prev) - (second - first)) / (n - 2)
+            # until the buffer wraps the valid rows are exactly _buf[:n]
+            np.ptp(self._buf[:n], axis=0, out=out[2 * F:])
+        return out
@@ -1,6 +1,9 @@
 import time
+import queue
 import logging
+import threading
 import sys
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
 
 log = logging.getLogger("keys")
 
@@ -146,6 +149,207 @@ def _get_pynput_key(key_name: str):
     return key_name
 
 
+# (offset_sec, "down"|"up", "keyboard"|"mouse", backend key/button), sorted by offset
+Step = Tuple[float, str, str, object]
+
+CHORD_DELAY = 0.01  # modifiers settle before the final key of a chord
+
+
+class CompiledMacro(NamedTuple):
+    """
+    A profile action resolved for one backend (KeySender.compile): its key
+    names are normalized and looked up once, so firing only replays `steps`.
+    An action with `errors` has no steps.
+    """
+    mode: str                 # "tap" | "hold"
+    steps: Tuple[Step, ...]
+    keys: Tuple[str, ...]     # normalized names, for logs
+    errors: Tuple[str, ...] = ()
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel: scheduling and cancelling are O(1), and each tick
+    only looks at one slot. Entries further out than one turn stay in their
+    slot until their absolute tick comes round.
+    """
+
+    def __init__(self, tick: float = 0.002, slots: int = 512):
+        self.tick = float(tick)
+        self.slots = int(slots)
+        self._wheel: List[list] = [[] for _ in range(self.slots)]
+        self._t0 = time.perf_counter()
+        self._cursor = 0  # last tick processed
+        self.pending = 0
+
+    def _now_tick(self) -> int:
+        return int((time.perf_counter() - self._t0) / self.tick)
+
+    def schedule(self, at: float, entry) -> None:
+        """Run `entry` at perf_counter time `at` (not before the next tick)."""
+        target = max(self._cursor + 1, int(-(-(at - self._t0) // self.tick)))
+        self._wheel[target % self.slots].append((target, entry))
+        self.pending += 1
+
+    def advance(self) -> list:
+        """Entries that are due, in schedule order per tick."""
+        due = []
+        now = self._now_tick()
+        # at most one turn: every slot is visited once, older ticks are due anyway
+        for t in range(self._cursor + 1, min(now, self._cursor + self.slots) + 1):
+            slot = self._wheel[t % self.slots]
+            if not slot:
+                continue
+            keep = []
+            for target, entry in slot:
+                (due if target <= now else keep).append(entry)
+            self._wheel[t % self.slots] = keep
+        self._cursor = max(self._cursor, now)
+        self.pending -= len(due)
+        return due
+
+
+class Macro:
+    """Handle for a submitted macro: wait() for it to finish, or cancel it."""
+
+    def __init__(self, steps: List[Step], hold: bool = False, on_start: Optional[Callable[[], None]] = None):
+        self.steps = steps
+        self.hold = hold              # keys stay down until cancel()
+        self.on_start = on_start      # called when the first key goes down
+        self.remaining = len(steps)
+        self.cancelled = False
+        self.held: Dict[Tuple[str, str], None] = {}  # keys this macro has down, in press order
+        self.done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done.wait(timeout)
+
+
+class MacroExecutor:
+    """
+    Input-dispatch thread. submit() only queues a command; the thread
+    presses keys and schedules their releases on a TimerWheel instead of
+    sleeping, so callers never block on input injection.
+
+    With overlap=False (default) a macro starts once the previous one has
+    finished; with overlap=True macros interleave. A key held by several
+    macros goes up when the last of them releases it. cancel() drops a
+    macro's pending steps and releases whatever it holds.
+    """
+
+    def __init__(self, down: Callable[[str, str], None], up: Callable[[str, str], None],
+                 overlap: bool = False, tick: float = 0.002):
+        self._down, self._up = down, up
+        self.overlap = bool(overlap)
+        self.wheel = TimerWheel(tick=tick)
+        self._q: "queue.Queue" = queue.Queue()
+        self._refs: Dict[Tuple[str, str], int] = {}
+        self._busy_until = 0.0
+        self._active: Dict[int, Macro] = {}
+        self._thread = threading.Thread(target=self._run, name="input-dispatch", daemon=True)
+        self._thread.start()
+
+    # ---- caller side (any thread) ----
+    def submit(self, steps: List[Step], hold: bool = False, on_start: Optional[Callable[[], None]] = None) -> Macro:
+        macro = Macro(steps, hold=hold, on_start=on_start)
+        self._q.put(("submit", macro))
+        return macro
+
+    def cancel(self, macro: Macro) -> None:
+        self._q.put(("cancel", macro))
+
+    def cancel_all(self) -> None:
+        self._q.put(("cancel_all", None))
+
+    def stop(self, timeout: float = 1.0) -> None:
+        self.cancel_all()
+        self._q.put(("stop", None))
+        self._thread.join(timeout)
+
+    # ---- dispatch thread ----
+    def _run(self) -> None:
+        while True:
+            try:
+                cmd, macro = self._q.get(timeout=self.wheel.tick if self.wheel.pending else None)
+            except queue.Empty:
+                cmd = None
+            if cmd == "stop":
+                return
+            try:
+                if cmd == "submit":
+                    self._start(macro)
+                elif cmd == "cancel":
+                    self._cancel(macro)
+                elif cmd == "cancel_all":
+                    for m in list(self._active.values()):
+                        self._cancel(m)
+                    self._busy_until = 0.0
+                for m, step in self.wheel.advance():
+                    self._step(m, step)
+            except Exception:
+                log.exception("Input dispatch failed")
+
+    def _start(self, macro: Macro) -> None:
+        if not macro.steps:
+            macro.done.set()
+            return
+        now = time.perf_counter()
+        start = now if (self.overlap or macro.hold) else max(now, self._busy_until)
+        if not (self.overlap or macro.hold):
+            self._busy_until = start + macro.steps[-1][0]
+        self._active[id(macro)] = macro
+        for step in macro.steps:
+            if step[0] <= 0 and start <= now:
+                self._step(macro, step)
+            else:
+                self.wheel.schedule(start + step[0], (macro, step))
+
+    def _step(self, macro: Macro, step: Step) -> None:
+        if macro.cancelled:
+            return
+        _, op, typ, name = step
+        key = (typ, name)
+        if op == "down":
+            if macro.on_start is not None:
+                on_start, macro.on_start = macro.on_start, None
+                on_start()
+            if self._refs.get(key, 0) == 0:
+                self._down(typ, name)
+            self._refs[key] = self._refs.get(key, 0) + 1
+            macro.held[key] = None
+        elif key in macro.held:
+            self._release(macro, key)
+        macro.remaining -= 1
+        if macro.remaining == 0 and not macro.hold:
+            self._finish(macro)
+
+    def _release(self, macro: Macro, key: Tuple[str, str]) -> None:
+        del macro.held[key]
+        self._refs[key] -= 1
+        if self._refs[key] == 0:
+            del self._refs[key]
+            try:
+                self._up(*key)
+            except Exception:
+                log.exception(f"Releasing '{key[1]}' failed")
+
+    def _cancel(self, macro: Macro) -> None:
+        if macro.done.is_set():
+            return
+        macro.cancelled = True
+        for key in reversed(list(macro.held)):
+            self._release(macro, key)
+        self._finish(macro)
+
+    def _finish(self, macro: Macro) -> None:
+        self._active.pop(id(macro), None)
+        macro.done.set()
+
+
 class KeySender:
     """
     Cross-platform key/mouse sender supporting Windows, Mac, and Linux.
@@ -154,10 +358,20 @@ class KeySender:
       {"type":"keyboard","keys":["space"],"hold_ms":50}
       {"type":"keyboard","keys":["ctrl","shift","a"],"hold_ms":50}
       {"type":"mouse","buttons":["left"],"hold_ms":50}
+      {"type":"keyboard","keys":["shift"],"mode":"hold"}   # down while the pose is held (press/release)
+
+    Mappings are compiled once (compile(), done by ProfileManager when a
+    profile loads) and injected by a MacroExecutor thread: submit() and
+    press()/release() return at once, run_macro() waits for the macro to finish.
     """
 
-    def __init__(self):
+    def __init__(self, overlap: bool = False):
         self._backend = self._detect_backend()
+        self.executor = MacroExecutor(self._down, self._up, overlap=overlap)
+        self._held: Dict[CompiledMacro, Macro] = {}
+        # press/release run on the fire stage, cancel_all on API threads; the lock keeps
+        # _held and the order of their executor commands in step
+        self._held_lock = threading.Lock()
         log.info(f"KeySender initialized with backend: {self._backend}")
 
     def _detect_backend(self) -> str:
@@ -169,153 +383,151 @@ class KeySender:
             return "keyboard"
         return "none"
 
-    def _send_keyboard_pynput(self, keys: list, hold_ms: int):
-        """Send keyboard input using pynput (cross-platform)."""
-        norm = [_norm_key(k) for k in keys if k]
-        if not norm:
-            log.warning("No keys to send.")
-            return
-
-        log.info(f"[pynput] Sending keys: {norm} | hold_ms={hold_ms}")
-
-        modifiers = {"ctrl", "shift", "alt", "cmd"}
-
-        # Check if this is a chord (modifiers + final key)
-        if len(norm) >= 2 and all(k in modifiers for k in norm[:-1]):
-            mods = norm[:-1]
-            final = norm[-1]
-
-            # Press modifiers
-            for m in mods:
-                pynput_keyboard.press(_get_pynput_key(m))
-            time.sleep(0.01)
-
-            # Press and release final key
-            final_key = _get_pynput_key(final)
-            pynput_keyboard.press(final_key)
-            time.sleep(hold_ms / 1000.0)
-            pynput_keyboard.release(final_key)
-
-            # Release modifiers in reverse order
-            for m in reversed(mods):
-                pynput_keyboard.release(_get_pynput_key(m))
-            return
-
-        # Sequential key presses
-        for k in norm:
-            key = _get_pynput_key(k)
-            pynput_keyboard.press(key)
-            time.sleep(hold_ms / 1000.0)
-            pynput_keyboard.release(key)
-
-    def _send_keyboard_pdi(self, keys: list, hold_ms: int):
-        """Send keyboard input using pydirectinput (Windows games)."""
-        norm = [_norm_key(k) for k in keys if k]
-        if not norm:
-            log.warning("No keys to send.")
-            return
-
-        log.info(f"[pydirectinput] Sending keys: {norm} | hold_ms={hold_ms}")
-
-        modifiers = {"ctrl", "shift", "alt"}
-
-        # Chord handling
-        if len(norm) >= 2 and all(k in modifiers for k in norm[:-1]):
-            mods = norm[:-1]
-            final = norm[-1]
-            for m in mods:
-                pdi.keyDown(m)
-            time.sleep(0.01)
-            pdi.keyDown(final)
-            time.sleep(hold_ms / 1000.0)
-            pdi.keyUp(final)
-            for m in reversed(mods):
-                pdi.keyUp(m)
-            return
-
-        # Sequential
-        for k in norm:
-            pdi.keyDown(k)
-            time.sleep(hold_ms / 1000.0)
-            pdi.keyUp(k)
-
-    def _send_keyboard_kb(self, keys: list, hold_ms: int):
-        """Send keyboard input using keyboard library."""
-        norm = [_norm_key(k) for k in keys if k]
-        if not norm:
-            log.warning("No keys to send.")
-            return
-
-        log.info(f"[keyboard] Sending keys: {norm} | hold_ms={hold_ms}")
-
-        modifiers = {"ctrl", "shift", "alt"}
-
-        # Chord handling
-        if len(norm) >= 2 and all(k in modifiers for k in norm[:-1]):
-            combo = "+".join(norm)
-            kb.send(combo, do_press=True, do_release=True)
-            return
-
-        # Sequential
-        for k in norm:
-            kb.press(k)
-            time.sleep(hold_ms / 1000.0)
-            kb.release(k)
-
-    def _send_keyboard(self, keys: list, hold_ms: int):
-        """Route keyboard input to the appropriate backend."""
+    # ---- primitives (dispatch thread; keys are already resolved by compile) ----
+    def _down(self, typ: str, key):
         if self._backend == "pynput":
-            self._send_keyboard_pynput(keys, hold_ms)
+            (pynput_mouse if typ == "mouse" else pynput_keyboard).press(key)
         elif self._backend == "pydirectinput":
-            self._send_keyboard_pdi(keys, hold_ms)
-        elif self._backend == "keyboard":
-            self._send_keyboard_kb(keys, hold_ms)
-        else:
-            log.error("No input backend available. Install pynput: pip install pynput")
-
-    def _send_mouse_pynput(self, buttons: list, hold_ms: int):
-        """Send mouse input using pynput (cross-platform)."""
-        norm = [_norm_key(b) for b in buttons if b]
-        log.info(f"[pynput] Clicking mouse: {norm} | hold_ms={hold_ms}")
-
-        for b in norm:
-            if b in PYNPUT_MOUSE_BUTTONS:
-                btn = PYNPUT_MOUSE_BUTTONS[b]
-                pynput_mouse.press(btn)
-                time.sleep(hold_ms / 1000.0)
-                pynput_mouse.release(btn)
+            if typ == "mouse":
+                pdi.mouseDown(button=key)
             else:
-                log.warning(f"Unknown mouse button: {b}")
-
-    def _send_mouse_pdi(self, buttons: list, hold_ms: int):
-        """Send mouse input using pydirectinput (Windows)."""
-        norm = [_norm_key(b) for b in buttons if b]
-        log.info(f"[pydirectinput] Clicking mouse: {norm} | hold_ms={hold_ms}")
-
-        for b in norm:
-            if b in ("left", "right", "middle"):
-                pdi.mouseDown(button=b)
-                time.sleep(hold_ms / 1000.0)
-                pdi.mouseUp(button=b)
-            else:
-                log.warning(f"Unknown mouse button: {b}")
+                pdi.keyDown(key)
+        elif self._backend == "keyboard":
+            kb.press(key)
 
-    def _send_mouse(self, buttons: list, hold_ms: int):
-        """Route mouse input to the appropriate backend."""
+    def _up(self, typ: str, key):
         if self._backend == "pynput":
-            self._send_mouse_pynput(buttons, hold_ms)
+            (pynput_mouse if typ == "mouse" else pynput_keyboard).release(key)
         elif self._backend == "pydirectinput":
-            self._send_mouse_pdi(buttons, hold_ms)
-        else:
-            log.error("Mouse input requires pynput or pydirectinput. Install pynput: pip install pynput")
+            if typ == "mouse":
+                pdi.mouseUp(button=key)
+            else:
+                pdi.keyUp(key)
+        elif self._backend == "keyboard":
+            kb.release(key)
 
-    def run_macro(self, mapping: dict):
-        """Execute a macro from the given mapping."""
-        if not mapping:
-            return
-        typ = mapping.get("type", "keyboard").lower()
-        hold_ms = int(mapping.get("hold_ms", 50))
+    # ---- mappings -> compiled macros ----
+    def _modifiers(self) -> set:
+        return {"ctrl", "shift", "alt", "cmd"} if self._backend == "pynput" else {"ctrl", "shift", "alt"}
+
+    def _resolve(self, typ: str, name: str) -> Tuple[object, Optional[str]]:
+        """Backend key/button for a normalized name: (key, None) or (None, error)."""
         if typ == "mouse":
-            self._send_mouse(mapping.get("buttons", []), hold_ms)
+            if self._backend == "pynput" and name in PYNPUT_MOUSE_BUTTONS:
+                return PYNPUT_MOUSE_BUTTONS[name], None
+            if self._backend == "pydirectinput" and name in ("left", "right", "middle"):
+                return name, None
+            if self._backend in ("pynput", "pydirectinput"):
+                return None, f"unknown mouse button '{name}'"
+            return None, "mouse input requires pynput or pydirectinput (pip install pynput)"
+        if self._backend == "pynput":
+            if name in PYNPUT_SPECIAL_KEYS or len(name) == 1:
+                return _get_pynput_key(name), None
+            return None, f"unknown key '{name}'"
+        if self._backend == "pydirectinput":
+            known = getattr(pdi, "KEYBOARD_MAPPING", None)
+            return (name, None) if known is None or name in known else (None, f"unknown key '{name}'")
+        if self._backend == "keyboard":
+            try:
+                kb.key_to_scan_codes(name)
+            except Exception:
+                return None, f"unknown key '{name}'"
+            return name, None
+        return None, "no input backend available (pip install pynput)"
+
+    def compile(self, mapping: dict) -> CompiledMacro:
+        """
+        Resolve a profile action for this backend. Taps become a timeline: a
+        chord (modifiers + final key) holds the modifiers around the final
+        key, otherwise keys/buttons are tapped one after another for hold_ms
+        each. Hold-mode actions become their key-downs (press/release).
+        """
+        mapping = mapping or {}
+        mode = "hold" if mapping.get("mode", "tap") == "hold" else "tap"
+        typ = mapping.get("type", "keyboard").lower()
+        hold = int(mapping.get("hold_ms", 50)) / 1000.0
+        names = mapping.get("buttons", []) if typ == "mouse" else mapping.get("keys", [])
+        norm = tuple(_norm_key(n) for n in names if n)
+        if not norm:
+            return CompiledMacro(mode, (), norm, ("no keys to send",))
+        resolved = [self._resolve(typ, n) for n in norm]
+        errors = tuple(err for _, err in resolved if err)
+        if errors:
+            return CompiledMacro(mode, (), norm, errors)
+        keys = [k for k, _ in resolved]
+        if mode == "hold":
+            return CompiledMacro(mode, tuple((0.0, "down", typ, k) for k in keys), norm)
+        if typ != "mouse" and len(norm) >= 2 and all(n in self._modifiers() for n in norm[:-1]):
+            steps = [(0.0, "down", typ, m) for m in keys[:-1]]
+            steps += [(CHORD_DELAY, "down", typ, keys[-1]), (CHORD_DELAY + hold, "up", typ, keys[-1])]
+            steps += [(CHORD_DELAY + hold, "up", typ, m) for m in reversed(keys[:-1])]
         else:
-            self._send_keyboard(mapping.get("keys", []), hold_ms)
+            steps = []
+            for i, k in enumerate(keys):
+                steps += [(i * hold, "down", typ, k), ((i + 1) * hold, "up", typ, k)]
+            steps.sort(key=lambda st: st[0])
+        return CompiledMacro(mode, tuple(steps), norm)
+
+    # ---- public ----
+    def _compiled(self, macro: Union[CompiledMacro, dict, None]) -> Optional[CompiledMacro]:
+        if macro is None or isinstance(macro, CompiledMacro):
+            return macro
+        macro = self.compile(macro)
+        for err in macro.errors:
+            log.warning(f"Cannot send {list(macro.keys)}: {err}")
+        return macro
+
+    def submit(self, macro: Union[CompiledMacro, dict], on_start: Optional[Callable[[], None]] = None) -> Optional[Macro]:
+        """
+        Queue a tap macro and return at once; on_start runs as its first key
+        goes down. Pass a CompiledMacro (ProfileManager.get_macro) on hot
+        paths; a plain mapping is compiled on every call.
+        """
+        macro = self._compiled(macro)
+        if not macro or not macro.steps:
+            return None
+        return self.executor.submit(list(macro.steps), on_start=on_start)
+
+    def run_macro(self, macro: Union[CompiledMacro, dict]):
+        """Execute a macro and wait until its last key is up."""
+        handle = self.submit(macro)
+        if handle is not None:
+            handle.wait()
+
+    def cancel_all(self):
+        """
+        Drop every queued macro and release all held keys. A hold pressed
+        concurrently goes down after this; the live loop releases it on the
+        next frame, since it releases holds whenever detection is disarmed.
+        """
+        with self._held_lock:
+            self._held.clear()
+            self.executor.cancel_all()
+
+    # ---- press / release (hold-mode actions) ----
+    def press(self, macro: Union[CompiledMacro, dict], on_start: Optional[Callable[[], None]] = None):
+        """Key-down every key/button of the macro (modifiers first) and leave them down."""
+        macro = self._compiled(macro)
+        if not macro or not macro.steps:
+            return
+        steps = [st for st in macro.steps if st[1] == "down"]
+        if macro.mode != "hold":
+            steps = [(0.0,) + st[1:] for st in steps]
+        log.debug(f"[{self._backend}] Pressing {list(macro.keys)}")
+        with self._held_lock:
+            prev = self._held.pop(macro, None)
+            if prev is not None:
+                self.executor.cancel(prev)
+            self._held[macro] = self.executor.submit(steps, hold=True, on_start=on_start)
+
+    def release(self, macro: Union[CompiledMacro, dict]):
+        """Key-up what press() held down, in reverse order."""
+        macro = self._compiled(macro)
+        if not macro:
+            return
+        with self._held_lock:
+            handle = self._held.pop(macro, None)
+            if handle is not None:
+                self.executor.cancel(handle)
+        if handle is not None:
+            log.debug(f"[{self._backend}] Releasing {list(macro.keys)}")
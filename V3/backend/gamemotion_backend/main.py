@@ -2,16 +2,27 @@ import cv2, os, sys, time, argparse, logging, threading, pathlib, json
 from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 
-from .util import ensure_dirs, load_json, setup_logging, CONFIG_DIR
-from .pose import PoseTracker
-from .features import extract_angle_signature
-from .actions import ActionRecognizer, ActionDB
+import numpy as np
+
+from .util import ensure_dirs, load_json, setup_logging, CONFIG_DIR, LOGS_DIR, DATA_DIR
+from .capture import open_camera, FrameCapture
+from .pose import PoseTracker, InferenceScheduler, track_frame
+from .features import extract_angle_signature, TemporalFeatureWindow
+from .actions import ActionDB, RecognizerCache
+from .dtw import DTWMatcher, open_templates
 from .game_detect import get_foreground_exe
 from .key_sender import KeySender
 from .profiles import ProfileManager
+from .decision import FireDecider, HoldState
+from .replay import run_replay
+from .recorder import LandmarkRecorder
+from .metrics import METRICS
+from .tracing import TRACER, profile_for
+from .pipeline import Pipeline, DROP_OLDEST, DROP_NEWEST, BLOCK
+from .preview import PreviewEncoder
 
 # FastAPI app + runtime (no circular import)
-from .api import app as fastapi_app, RUNTIME as API_RUNTIME, append_log
+from .api import app as fastapi_app, RUNTIME as API_RUNTIME, append_log, publish_preview
 import uvicorn
 
 log = logging.getLogger("main")
@@ -56,8 +67,11 @@ def run_api_server():
 
     # Signal ready shortly after server starts
     def signal_ready():
+        start = TRACER.now_us()
         time.sleep(0.3)  # Brief delay for server to bind
-        if port_ready():
+        ready = port_ready()
+        TRACER.complete("api_startup", start, TRACER.now_us() - start, cat="startup")
+        if ready:
             _api_ready.set()
             log.info("API server is ready")
         else:
@@ -65,7 +79,8 @@ def run_api_server():
             _api_ready.set()
             log.warning("API server may not be fully ready")
 
-    threading.Thread(target=signal_ready, daemon=True).start()
+    threading.Thread(target=signal_ready, name="api-ready", daemon=True).start()
+    TRACER.instant("api_server_run", cat="startup")
     server.run()
 
 
@@ -87,6 +102,7 @@ def main():
     ap.add_argument("--camera", type=int, default=0)
     ap.add_argument("--width", type=int, default=cfg.get("frame_width", 1280))
     ap.add_argument("--height", type=int, default=cfg.get("frame_height", 720))
+    ap.add_argument("--fps", type=float, default=cfg.get("camera_fps", 30))
     ap.add_argument("--preview", action="store_true", help="Show camera window")
     ap.add_argument("--complexity", type=int, default=cfg.get("model_complexity", 0))
     ap.add_argument("--train", action="store_true", help="Training mode")
@@ -94,14 +110,35 @@ def main():
     ap.add_argument("--action", type=str, default=None)
     ap.add_argument("--samples", type=int, default=25)
     ap.add_argument("--no-api", action="store_true", help="Disable local API")
+    ap.add_argument("--source", type=str, default=None,
+                    help="Replay a video file or recorded landmark session instead of the camera")
+    ap.add_argument("--realtime", action="store_true", help="With --source: pace replay at recorded speed")
+    ap.add_argument("--report", type=str, default=None, help="With --source: write the replay report as JSON")
+    ap.add_argument("--record", type=str, default=None,
+                    help="Record every inferred frame's landmarks to a .gmls session file")
+    ap.add_argument("--trace", type=str, default=None,
+                    help="Record per-frame stage spans and write a Chrome trace (JSON) here on exit")
+    ap.add_argument("--profile", action="store_true",
+                    help="Record spans and run the sampling profiler once the loop starts")
+    ap.add_argument("--profile-seconds", type=float, default=10.0)
     args = ap.parse_args()
 
+    if args.trace or args.profile:
+        TRACER.enable()
+
+    # Offline replay: no camera, API or key output
+    if args.source:
+        report = run_replay(args.source, args.game, cfg, realtime=args.realtime,
+                            complexity=args.complexity, report_path=args.report)
+        print(json.dumps(report, indent=2))
+        return
+
     # === PARALLEL INITIALIZATION ===
     # Start multiple components in parallel for faster startup
 
     # 1. Start API server in background (non-blocking)
     if not args.no_api:
-        api_thread = threading.Thread(target=run_api_server, daemon=True)
+        api_thread = threading.Thread(target=run_api_server, name="api-server", daemon=True)
         api_thread.start()
         log.info("API server starting in background...")
 
@@ -109,16 +146,20 @@ def main():
     tracker = PoseTracker(
         complexity=args.complexity,
         min_det=cfg.get("min_detection_confidence", 0.5),
-        min_track=cfg.get("min_tracking_confidence", 0.5)
+        min_track=cfg.get("min_tracking_confidence", 0.5),
+        roi_tracking=cfg.get("roi_tracking", False),
+        roi_padding=cfg.get("roi_padding", 0.25),
+        roi_size=cfg.get("roi_size", 256),
+        inference_size=cfg.get("inference_size", 0),
     )
 
     # 3. Start model warmup in background while we set up other components
-    warmup_thread = tracker.warmup()
+    warmup_thread = tracker.warmup(shape=(args.height, args.width))
     log.info("MediaPipe model warming up in background...")
 
     # 4. Initialize other components (these are fast)
-    key_sender = KeySender()
-    profman = ProfileManager()
+    key_sender = KeySender(overlap=bool(cfg.get("macro_overlap", False)))
+    profman = ProfileManager(compiler=key_sender.compile)  # actions are compiled to macros on load
 
     # Publish to API runtime
     API_RUNTIME["key_sender"] = key_sender
@@ -126,20 +167,14 @@ def main():
 
     # 5. Open camera (can take a moment)
     log.info(f"Opening camera {args.camera}...")
-    if IS_WINDOWS:
-        cap = cv2.VideoCapture(args.camera, cv2.CAP_DSHOW)
-    elif IS_MAC:
-        cap = cv2.VideoCapture(args.camera, cv2.CAP_AVFOUNDATION)
-    else:
-        cap = cv2.VideoCapture(args.camera)  # Default backend for Linux
-
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, args.width)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, args.height)
+    cap = open_camera(args.camera, args.width, args.height, fps=args.fps, mjpg=cfg.get("camera_mjpg", True))
 
     if not cap.isOpened():
         log.error("Camera not available")
         return
 
+    # Frames are pulled on their own thread; the loop always gets the newest one
+    capture = FrameCapture(cap).start()
     log.info(f"Camera opened: {args.width}x{args.height}")
 
     # 6. Wait for API server to be ready (with timeout)
@@ -157,37 +192,61 @@ def main():
 
     # === MAIN LOOP SETUP ===
     offline_threshold = float(cfg.get("offline_threshold", 0.82))
-    action_cooldown = float(cfg.get("action_cooldown_sec", 1.0))
-    frames_confirm = int(cfg.get("frames_confirm", 4))
+    temporal_features = bool(cfg.get("temporal_features", False))
+    classifier = cfg.get("classifier", "centroid")
+    classifier_opts = cfg.get("classifier_opts", {})
+    dtw_band = float(cfg.get("dtw_band", 0.25))
+    dtw_min_score = float(cfg.get("dtw_min_score", 0.5))
 
     recognizer = None
+    matcher = None
     adb = ActionDB()
-    feat_history = deque(maxlen=5)
-    stable_label = None
-    stable_count = 0
-    last_action_time = 0.0
-    last_conf = 0.0
+    # alt-tabbing between games is a cache hit; recently played games are warmed in the background
+    recognizers = RecognizerCache(max_bytes=int(float(cfg.get("recognizer_cache_mb", 256)) * (1 << 20)))
+    recognizer_opts = dict(temporal=temporal_features, backend=classifier, backend_opts=classifier_opts)
+    prefetch_games = int(cfg.get("prefetch_recent_games", 3))
+    if prefetch_games > 0:
+        recognizers.prefetch(recognizers.recent(prefetch_games), **recognizer_opts)
+    decider = FireDecider.from_config(cfg)
+    # hold-mode actions: key-down on entry, key-up once the score drops below its release level
+    holds = HoldState(release_threshold=float(cfg.get("release_threshold", 0.9)),
+                      rearm_frames=int(cfg.get("rearm_frames", 6)),
+                      release_margin=float(cfg.get("release_margin", 0.02)))
+    strict_quantile = float(cfg.get("strict_quantile", 0.9))
+    min_samples_per_action = int(cfg.get("min_samples_per_action", 10))
+    training = threading.Event()  # pauses firing while samples are collected
 
     # exe/profile tracking
     active_exe = None
 
+    def switch_profile():
+        nonlocal active_exe, recognizer, matcher
+        exe, _ = get_foreground_exe()
+        if args.game:
+            exe = args.game
+        if exe and exe != active_exe:
+            active_exe = exe
+            recognizer = recognizers.get(exe, offline_threshold=offline_threshold, **recognizer_opts)
+            matcher = DTWMatcher(open_templates(DATA_DIR / exe), band=dtw_band, min_score=dtw_min_score)
+            prof = profman.get_profile_for_exe(exe)
+            API_RUNTIME["active_exe"] = exe
+            API_RUNTIME["active_profile"] = prof
+            log.info(f"Active exe: {exe} | profile: {prof.get('display_name') if prof else 'None'}")
+
+    def refresh_thresholds():
+        # per-label floors follow the samples; cached until the game's store changes
+        rec = recognizer
+        if rec:
+            decider.label_thresholds = rec.label_thresholds(strict_quantile, min_samples_per_action)
+
     def update_active_profile():
-        nonlocal active_exe, recognizer
         while True:
-            exe, _ = get_foreground_exe()
-            if args.game:
-                exe = args.game
-            if exe and exe != active_exe:
-                active_exe = exe
-                recognizer = ActionRecognizer(exe, offline_threshold=offline_threshold)
-                _ = adb._load_all(exe)  # ensure index
-                prof = profman.get_profile_for_exe(exe)
-                API_RUNTIME["active_exe"] = exe
-                API_RUNTIME["active_profile"] = prof
-                log.info(f"Active exe: {exe} | profile: {prof.get('display_name') if prof else 'None'}")
+            with TRACER.span("update_active_profile", cat="background"):
+                switch_profile()
+                refresh_thresholds()
             time.sleep(1.0)
 
-    threading.Thread(target=update_active_profile, daemon=True).start()
+    threading.Thread(target=update_active_profile, name="profile-watch", daemon=True).start()
 
     # training request watcher (from API)
     def check_train_request():
@@ -197,99 +256,236 @@ def main():
             return tr
         return None
 
-    # === MAIN LOOP ===
-    log.info("Starting main detection loop...")
-    frame_i = 0
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    # === PIPELINE STAGES ===
+    # capture thread -> pose -> classify -> fire
+    #                        \-> preview (and training, while active)
+    scheduler = InferenceScheduler(
+        idle_speed=cfg.get("idle_speed", 0.05),
+        max_skip=cfg.get("idle_max_skip", 1) if cfg.get("adaptive_inference", True) else 0,
+        motion_hold_sec=cfg.get("motion_hold_sec", 0.5),
+    )
+    motion = TemporalFeatureWindow(size=int(cfg.get("temporal_window", 8)))
+
+    def pose_stage(captured):
+        t0 = time.perf_counter()
+        METRICS.stage("capture", time.monotonic() - captured.ts)
+        results, landmarks, inferred = track_frame(tracker, scheduler, captured.image, captured.ts)
+        t1 = time.perf_counter()
+        METRICS.stage("pose", t1 - t0)
+        feats = temporal = None
+        if landmarks is not None:
+            feats = extract_angle_signature(landmarks)
+            temporal = motion.update(feats)
+        else:
+            motion.reset()  # a gap would read as a jump
+        METRICS.stage("features", time.perf_counter() - t1)
+        return {"frame": captured, "results": results, "landmarks": landmarks, "feats": feats,
+                "temporal": temporal, "inferred": inferred}
 
-        results = tracker.process(frame)
+    def classify_stage(item):
         label_to_fire = None
+        second_best = 0.0
+        rec, dtw = recognizer, matcher
+        now = time.time()
+        exe = active_exe
+        events = []  # (kind, label, compiled macro) for the fire stage, in order
+        armed = API_RUNTIME.get("detect_enabled", True) and not training.is_set()
+        if holds.held and (item["feats"] is None or not armed or holds.payload[0] != exe):
+            label, (_, macro) = holds.release()  # body lost, detection paused or game switched
+            events.append(("release", label, macro))
+        if item["feats"] is None and dtw:
+            dtw.reset()
+        if item["feats"] is not None and rec:
+            t0 = time.perf_counter()
+            feats = np.concatenate([item["feats"], item["temporal"]]) if temporal_features else item["feats"]
+            best_label, best_score, second_best = rec.classify_offline(feats)
+            calibrated = True
+            if dtw:
+                # a just-completed motion template (already past dtw_min_score)
+                # outranks the static pose it ends in
+                dyn = dtw.push(item["feats"])
+                if dyn[0] is not None:
+                    best_label, best_score, second_best = dyn
+                    calibrated = False
+            released = holds.update(best_label, best_score, calibrated)
+            if released:
+                label, (_, macro) = released
+                events.append(("release", label, macro))
+            label_to_fire = decider.update(best_label, best_score, second_best, now, armed=armed,
+                                           calibrated=calibrated)
+            METRICS.stage("classify", time.perf_counter() - t0)
+            API_RUNTIME["cooldown_left"] = decider.cooldown_left(now)
 
-        if results.pose_landmarks is not None:
-            landmarks = tracker.to_landmark_array(results)
-            feats = extract_angle_signature(landmarks)
-            feat_history.append(feats)
-
-            # live classification
-            if recognizer:
-                best_label, best_score, second_best = recognizer.classify_offline(feats)
-                last_conf = float(best_score)
-                # stability filter
-                if best_label == stable_label:
-                    stable_count = min(stable_count + 1, 1000)
+        # publish telemetry every frame
+        API_RUNTIME["stable"] = decider.stable_count
+        API_RUNTIME["frames_needed"] = decider.required
+        API_RUNTIME["last_conf"] = float(decider.last_conf)
+        API_RUNTIME["held"] = holds.held
+
+        if label_to_fire and exe:
+            macro = profman.get_macro(exe, label_to_fire)
+            if macro is not None and not macro.ok:
+                macro = None  # reported when the profile loaded
+            if macro and macro.mode == "hold":
+                # no cooldown: the key stays down until the pose is left
+                if holds.can_press(label_to_fire):
+                    if holds.held:
+                        label, (_, prev) = holds.release()
+                        events.append(("release", label, prev))
+                    holds.press(label_to_fire, (exe, macro), floor=decider.floor(label_to_fire, second_best <= -1.0))
+                    events.append(("press", label_to_fire, macro))
+            elif macro:
+                # claim the cooldown now; the macro may still be queued behind a previous one
+                decider.fired(now)
+                events.append(("tap", label_to_fire, macro))
+        if events:
+            return {"events": events, "exe": exe, "capture_ts": item["frame"].ts}
+        return None
+
+    def fire_stage(item):
+        for kind, label, macro in item["events"]:
+            if kind == "release":
+                log.info(f"Releasing action '{label}'")
+                key_sender.release(macro)
+                continue
+            log.info(f"Firing action '{label}'" + (" (hold)" if kind == "press" else ""))
+
+            def on_start(ts=item["capture_ts"], exe=item["exe"]):
+                # runs on the input thread as the first key goes down
+                METRICS.observe("gamemotion_capture_to_keypress_seconds", time.monotonic() - ts, exe=exe)
+
+            with METRICS.time_stage("fire"):
+                # only queues the macro; the input thread presses and releases the keys
+                if kind == "press":
+                    key_sender.press(macro, on_start=on_start)
                 else:
-                    stable_label = best_label
-                    stable_count = 1
-
-                # fire?
-                now = time.time()
-                API_RUNTIME["cooldown_left"] = max(0.0, action_cooldown - (now - last_action_time))
-                if (API_RUNTIME.get("detect_enabled", True) and
-                    best_label and
-                    stable_count >= frames_confirm and
-                    (now - last_action_time) >= action_cooldown):
-                    label_to_fire = best_label
+                    key_sender.submit(macro, on_start=on_start)
+
+    # preview frames are only produced while someone is watching
+    preview_idle_sec = float(cfg.get("preview_idle_sec", 2.0))
+
+    def preview_wanted():
+        return time.monotonic() - API_RUNTIME.get("preview_requested_at", 0.0) < preview_idle_sec
+
+    preview = PreviewEncoder(
+        publish=publish_preview,
+        is_wanted=preview_wanted,
+        width=int(cfg.get("preview_width", 640)),
+        max_fps=float(cfg.get("preview_fps", 15)),
+        budget_ms=float(cfg.get("preview_budget_ms", 5.0)),
+        quality=int(cfg.get("preview_quality", 80)),
+        local_window=args.preview,
+    )
 
-        # publish telemetry every frame
-        API_RUNTIME["stable"] = stable_count
-        API_RUNTIME["last_conf"] = float(last_conf)
-
-        # make preview JPEG for the frontend (every 2nd frame)
-        if results is not None:
-            PoseTracker.draw(frame, results)
-        if frame_i % 2 == 0:
-            ok, jpeg = cv2.imencode(".jpg", frame)
-            if ok:
-                API_RUNTIME["latest_jpeg"] = jpeg.tobytes()
-        frame_i += 1
-
-        # fire mapping if any
-        if label_to_fire and active_exe:
-            prof = profman.get_profile_for_exe(active_exe)
-            if prof:
-                mapping = prof.get("actions", {}).get(label_to_fire)
-                if mapping:
-                    log.info(f"Firing action '{label_to_fire}'")
-                    key_sender.run_macro(mapping)
-                    last_action_time = time.time()
-                    stable_count = 0  # reset after action
+    def make_train_stage(game, action, samples, sequence_frames=0):
+        if sequence_frames > 0:
+            return make_sequence_stage(game, action, samples, sequence_frames)
+        save_dir = (pathlib.Path(__file__).resolve().parent.parent / "data" / game / action)
+        save_dir.mkdir(parents=True, exist_ok=True)
+        feat_history = deque(maxlen=5)
+        state = {"collected": 0}
+
+        def train_stage(item):
+            if state["collected"] >= samples or item["feats"] is None or not item["inferred"]:
+                return
+            feat_history.append(item["feats"])
+            if len(feat_history) == feat_history.maxlen:
+                ts = int(time.time()*1000)
+                cv2.imwrite(str(save_dir / f"{ts}.jpg"), item["frame"].image)
+                adb.add_sample(game, action, item["feats"], str(save_dir / f"{ts}.jpg"), item["landmarks"],
+                               temporal=item["temporal"])
+                state["collected"] += 1
+                log.info(f"Captured sample {state['collected']}/{samples}")
+                feat_history.clear()
+                if state["collected"] >= samples:
+                    log.info("Done collecting samples.")
+                    training.clear()
+
+        return train_stage
+
+    def make_sequence_stage(game, action, samples, frames):
+        # motion templates: `frames` consecutive signatures each, matched with DTW
+        templates = open_templates(DATA_DIR / game)
+        seq = []
+        state = {"collected": 0}
+
+        def sequence_stage(item):
+            if state["collected"] >= samples:
+                return
+            if item["feats"] is None:
+                seq.clear()  # the body was lost mid-motion; start over
+                return
+            seq.append(item["feats"])
+            if len(seq) == frames:
+                templates.add(action, np.stack(seq))
+                seq.clear()
+                state["collected"] += 1
+                log.info(f"Captured motion template {state['collected']}/{samples} ({frames} frames)")
+                if state["collected"] >= samples:
+                    log.info("Done collecting templates.")
+                    training.clear()
+
+        return sequence_stage
+
+    pipeline = Pipeline()
+    pipeline.add_stage("pose", pose_stage, maxsize=1, policy=DROP_OLDEST)
+    pipeline.add_stage("classify", classify_stage, after="pose", maxsize=4, policy=BLOCK)
+    pipeline.add_stage("fire", fire_stage, after="classify", maxsize=4, policy=BLOCK)
+    pipeline.add_stage("preview", preview, after="pose", maxsize=1, policy=DROP_OLDEST)
+    recorder = None
+    if args.record:
+        recorder = LandmarkRecorder(args.record)
+
+        def record_stage(item):
+            if item["inferred"]:
+                recorder.write(item["frame"].ts, item["landmarks"])
+
+        # disk writers never stall pose inference; a full queue drops frames with a warning
+        pipeline.add_stage("record", record_stage, after="pose", maxsize=64, policy=DROP_NEWEST)
+    pipeline.start()
+    API_RUNTIME["pipeline"] = pipeline
+
+    if args.profile:
+        def _startup_profile():
+            res = profile_for(args.profile_seconds, LOGS_DIR)
+            log.info(f"Profile written to {res['path']}; top: {res['top'][:5]}")
+        threading.Thread(target=_startup_profile, name="profiler", daemon=True).start()
+
+    # === MAIN LOOP ===
+    # The main thread only feeds frames, handles training requests and owns the
+    # OpenCV window (GUI calls must stay on the main thread on macOS).
+    log.info("Starting main detection loop...")
+    last_seq = 0
+
+    while True:
+        captured = capture.read(after_seq=last_seq)
+        if captured is None:
+            if not capture.running:
+                break
+            continue
+        last_seq = captured.seq
+        pipeline.submit("pose", captured)
 
         # handle queued training request (from /train/start)
-        tr = check_train_request()
+        if not training.is_set() and pipeline.has_stage("train"):
+            pipeline.remove_stage("train")
+        # a request sent while samples are being collected stays queued until that run ends
+        tr = check_train_request() if not training.is_set() else None
         if tr:
             game = tr["game"]
             action = tr["action"]
             samples = int(tr["samples"])
-            save_dir = (pathlib.Path(__file__).resolve().parent.parent / "data" / game / action)
-            save_dir.mkdir(parents=True, exist_ok=True)
-            log.info(f"Training mode: game={game} action={action} samples={samples}")
-            collected = 0
-            feat_history.clear()
-            while collected < samples:
-                ret2, frm = cap.read()
-                if not ret2:
-                    break
-                res2 = tracker.process(frm)
-                if res2.pose_landmarks is None:
-                    continue
-                lm2 = tracker.to_landmark_array(res2)
-                f2 = extract_angle_signature(lm2)
-                feat_history.append(f2)
-                if len(feat_history) == feat_history.maxlen:
-                    ts = int(time.time()*1000)
-                    cv2.imwrite(str(save_dir / f"{ts}.jpg"), frm)
-                    adb.add_sample(game, action, f2, str(save_dir / f"{ts}.jpg"), lm2)
-                    collected += 1
-                    log.info(f"Captured sample {collected}/{samples}")
-                    feat_history.clear()
-            log.info("Done collecting samples.")
+            sequence_frames = int(tr.get("sequence_frames") or 0)
+            log.info(f"Training mode: game={game} action={action} samples={samples}"
+                     f"{f' sequence_frames={sequence_frames}' if sequence_frames else ''}")
+            training.set()
+            pipeline.add_stage("train", make_train_stage(game, action, samples, sequence_frames), after="pose",
+                               maxsize=8, policy=DROP_NEWEST)
 
         # preview window (optional)
-        if args.preview:
+        frame = preview.window_frame
+        if args.preview and frame is not None:
+            preview.window_frame = None
             overlay_text(frame, f"exe: {API_RUNTIME.get('active_exe') or 'n/a'}", y=30)
             overlay_text(frame, f"conf: {API_RUNTIME.get('last_conf',0):.3f} stab:{API_RUNTIME.get('stable',0)}/10", y=60)
             cv2.imshow("GameMotion Backend - Preview", frame)
@@ -297,7 +493,18 @@ def main():
             if key in (27, ord('q'), ord('Q')):
                 break
 
-    cap.release()
+    pipeline.stop()
+    released = holds.release()
+    if released:
+        key_sender.release(released[1][1])  # never leave a held key down
+    key_sender.executor.stop()
+    if recorder is not None:
+        recorder.close()
+    if args.trace or args.profile:
+        TRACER.write(args.trace or LOGS_DIR / f"trace-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    log.info(f"Capture dropped {capture.dropped} stale frames; "
+             f"pose inference skipped {scheduler.skipped_total}/{scheduler.inferred + scheduler.skipped_total} idle frames")
+    capture.stop()
     tracker.close()
     cv2.destroyAllWindows()
     log.info("GameMotion stopped")
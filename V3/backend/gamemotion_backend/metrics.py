@@ -0,0 +1,119 @@
+# gamemotion_backend/metrics.py
+"""
+Low-overhead latency metrics.
+
+Each series keeps its last N observations in a fixed ring buffer, so recording
+is O(1) with no allocation; quantiles are only computed when /metrics is
+scraped. Exposed in Prometheus text format as summaries (p50/p95/p99 over the
+rolling window, plus lifetime _sum and _count).
+"""
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_HELP = {
+    "gamemotion_stage_seconds": "Per-stage processing time (capture = frame age when pose starts)",
+    "gamemotion_capture_to_keypress_seconds": "Camera capture to key injection latency, per game",
+}
+
+
+class RollingHistogram:
+    """Ring buffer of the last `size` observations plus lifetime count/sum."""
+
+    def __init__(self, size: int = 2048):
+        self._buf = np.zeros(int(size), dtype=np.float64)
+        self._i = 0
+        self._n = 0
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._buf[self._i] = value
+            self._i = (self._i + 1) % self._buf.size
+            if self._n < self._buf.size:
+                self._n += 1
+            self.count += 1
+            self.sum += value
+
+    def quantiles(self, qs: Iterable[float] = QUANTILES) -> Dict[float, float]:
+        with self._lock:
+            window = self._buf[:self._n].copy()
+        if window.size == 0:
+            return {q: float("nan") for q in qs}
+        return dict(zip(qs, np.quantile(window, list(qs)).tolist()))
+
+
+class Metrics:
+    """Registry of rolling histograms keyed by (metric name, sorted label pairs)."""
+
+    def __init__(self, window: int = 2048):
+        self.window = int(window)
+        self._series: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], RollingHistogram] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str, labels: Dict[str, str]) -> RollingHistogram:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        hist = self._series.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._series.setdefault(key, RollingHistogram(self.window))
+        return hist
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        self._get(name, labels).observe(seconds)
+
+    def stage(self, stage: str, seconds: float) -> None:
+        self.observe("gamemotion_stage_seconds", seconds, stage=stage)
+
+    @contextmanager
+    def time_stage(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage(stage, time.perf_counter() - t0)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """{"name{labels}": {"p50":..,"p95":..,"p99":..,"count":..}} for JSON consumers."""
+        out = {}
+        for (name, labels), hist in list(self._series.items()):
+            q = hist.quantiles()
+            lbl = ",".join(f"{k}={v}" for k, v in labels)
+            out[f"{name}{{{lbl}}}"] = {"p50": q[0.5], "p95": q[0.95], "p99": q[0.99], "count": hist.count}
+        return out
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        by_name: Dict[str, list] = {}
+        for (name, labels), hist in list(self._series.items()):
+            by_name.setdefault(name, []).append((labels, hist))
+        for name in sorted(by_name):
+            lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} summary")
+            for labels, hist in sorted(by_name[name], key=lambda x: x[0]):
+                base = [f'{k}="{_escape(v)}"' for k, v in labels]
+                for q, v in hist.quantiles().items():
+                    qlabels = ",".join(base + [f'quantile="{q}"'])
+                    lines.append(f"{name}{{{qlabels}}} {_fmt(v)}")
+                lbl = "{" + ",".join(base) + "}" if base else ""
+                lines.append(f"{name}_sum{lbl} {_fmt(hist.sum)}")
+                lines.append(f"{name}_count{lbl} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(v: float) -> str:
+    return "NaN" if v != v else repr(float(v))
+
+
+METRICS = Metrics()
@@ -0,0 +1,186 @@
+# gamemotion_backend/pipeline.py
+import queue
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Any
+
+from .tracing import TRACER
+
+log = logging.getLogger("pipeline")
+
+# Back-pressure policies for a stage's input queue
+DROP_OLDEST = "drop_oldest"  # full queue: discard the oldest item, never stall the producer
+BLOCK = "block"              # full queue: producer waits (nothing may be lost, e.g. key presses)
+DROP_NEWEST = "drop_newest"  # full queue: discard the incoming item and warn (slow sinks, e.g. disk writers)
+
+
+class Stage:
+    """
+    One pipeline stage: a worker thread draining a bounded input queue.
+
+    `fn(item)` runs on the stage thread. A non-None return value is handed to
+    every downstream stage, each of which applies its own back-pressure policy.
+    """
+
+    def __init__(self, name: str, fn: Callable[[Any], Any], maxsize: int = 1, policy: str = DROP_OLDEST):
+        if policy not in (DROP_OLDEST, BLOCK, DROP_NEWEST):
+            raise ValueError(f"unknown back-pressure policy: {policy}")
+        self.name = name
+        self.fn = fn
+        self.policy = policy
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, int(maxsize)))
+        self._downstream: List["Stage"] = []
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.processed = 0
+        self.dropped = 0
+
+    # ---- wiring ----
+    def connect(self, stage: "Stage") -> None:
+        # copy-on-write so the worker can iterate without a lock
+        self._downstream = self._downstream + [stage]
+
+    def disconnect(self, stage: "Stage") -> None:
+        self._downstream = [s for s in self._downstream if s is not stage]
+
+    # ---- queue ----
+    def put(self, item: Any) -> None:
+        if self.policy == BLOCK:
+            while self._running:
+                try:
+                    self._q.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+            return
+        if self.policy == DROP_NEWEST:
+            try:
+                self._q.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 100 == 0:
+                    log.warning(f"Stage '{self.name}' cannot keep up; dropped {self.dropped} items so far")
+            return
+        while True:
+            try:
+                self._q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._q.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    # ---- lifecycle ----
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"stage-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        while self._running:
+            try:
+                item = self._q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            try:
+                if TRACER.enabled:
+                    with TRACER.span(self.name):
+                        out = self.fn(item)
+                else:
+                    out = self.fn(item)
+            except Exception:
+                log.exception(f"Stage '{self.name}' failed")
+                continue
+            self.processed += 1
+            if out is not None:
+                for s in self._downstream:
+                    s.put(out)
+
+
+class Pipeline:
+    """
+    Registry of named stages connected by bounded queues.
+
+    Stages can be added or removed while the pipeline runs, so optional
+    consumers (preview, training, recording) attach behind an existing stage
+    without the hot path knowing about them.
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, Stage] = {}
+        self._upstream: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self._running = False
+
+    def add_stage(
+        self,
+        name: str,
+        fn: Callable[[Any], Any],
+        after: Optional[str] = None,
+        maxsize: int = 1,
+        policy: str = DROP_OLDEST,
+    ) -> Stage:
+        with self._lock:
+            if name in self._stages:
+                raise ValueError(f"stage '{name}' already registered")
+            if after is not None and after not in self._stages:
+                raise KeyError(f"unknown upstream stage '{after}'")
+            stage = Stage(name, fn, maxsize=maxsize, policy=policy)
+            self._stages[name] = stage
+            self._upstream[name] = after
+            if self._running:
+                stage.start()
+            if after is not None:
+                self._stages[after].connect(stage)
+        log.info(f"Stage '{name}' registered (after={after}, maxsize={maxsize}, policy={policy})")
+        return stage
+
+    def remove_stage(self, name: str) -> None:
+        with self._lock:
+            stage = self._stages.pop(name, None)
+            after = self._upstream.pop(name, None)
+            if stage is None:
+                return
+            if after is not None and after in self._stages:
+                self._stages[after].disconnect(stage)
+            for child, parent in list(self._upstream.items()):
+                if parent == name:
+                    stage.disconnect(self._stages[child])
+                    self._upstream[child] = None
+        stage.stop()
+        log.info(f"Stage '{name}' removed")
+
+    def has_stage(self, name: str) -> bool:
+        return name in self._stages
+
+    def submit(self, name: str, item: Any) -> None:
+        """Feed an item into a stage (normally the pipeline's entry stage)."""
+        self._stages[name].put(item)
+
+    def start(self) -> None:
+        with self._lock:
+            self._running = True
+            for stage in self._stages.values():
+                stage.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._running = False
+            stages = list(self._stages.values())
+        for stage in stages:
+            stage.stop()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {"processed": s.processed, "dropped": s.dropped, "queued": s._q.qsize()}
+            for name, s in list(self._stages.items())
+        }
@@ -4,6 +4,8 @@ import numpy as np
 import logging
 import threading
 
+from .tracing import TRACER
+
 log = logging.getLogger("pose")
 
 _BODY_CONN = [
@@ -17,6 +19,7 @@ _BODY_CONN = [
     (27, 29), (29, 31), (28, 30), (30, 32),
 ]
 _FACE_MAX_IDX = 10  # pose landmark indices 0..10 are head/face (nose/eyes/ears/mouth)
+_BODY_IDXS = sorted({i for conn in _BODY_CONN for i in conn})
 
 
 class PoseTracker:
@@ -27,12 +30,25 @@ class PoseTracker:
     rather than at construction time, which significantly improves startup time.
     """
 
-    def __init__(self, complexity=0, min_det=0.5, min_track=0.5, ignore_face=True):
+    def __init__(self, complexity=0, min_det=0.5, min_track=0.5, ignore_face=True,
+                 roi_tracking=False, roi_padding=0.25, roi_size=256, inference_size=0):
         self.ignore_face = bool(ignore_face)
         self._complexity = int(complexity)
         self._min_det = float(min_det)
         self._min_track = float(min_track)
 
+        # ROI tracking: crop around the previous frame's landmarks before inference
+        self.roi_tracking = bool(roi_tracking)
+        self.roi_padding = float(roi_padding)
+        self.roi_size = int(roi_size)
+        self._roi = None  # (x0, y0, x1, y1) in frame pixels, None = full frame
+
+        # Preprocessing: longer side of full-frame inference input (0 = native size).
+        # Buffers are allocated once per input shape and reused every frame.
+        self.inference_size = int(inference_size)
+        self._buffers = {}
+        self.last_scale = (1.0, 1.0)  # (sx, sy) = inference pixels / source pixels of the last frame
+
         # Lazy-loaded components
         self._mp_pose = None
         self._mp_draw = None
@@ -77,28 +93,116 @@ class PoseTracker:
             self._initialized = True
             log.info("MediaPipe pose model initialized successfully")
 
-    def warmup(self):
+    def warmup(self, shape=(480, 640)):
         """
         Pre-initialize the model in a background thread.
         Call this early to reduce latency on first frame processing.
         """
         def _warmup():
-            self._ensure_initialized()
-            # Process a dummy frame to fully warm up the model
-            dummy = np.zeros((480, 640, 3), dtype=np.uint8)
-            self.process(dummy)
+            with TRACER.span("warmup", cat="startup"):
+                self._ensure_initialized()
+                # Run the model once on a (zeroed) preprocessing buffer; the buffer is kept for reuse
+                bgr, rgb = self._buffers_for(*self._inference_shape(*shape))
+                self._pose.process(rgb)
             log.info("PoseTracker warmup complete")
 
-        thread = threading.Thread(target=_warmup, daemon=True)
+        thread = threading.Thread(target=_warmup, name="pose-warmup", daemon=True)
         thread.start()
         return thread
 
+    def _inference_shape(self, h, w):
+        if self.inference_size <= 0 or max(h, w) <= self.inference_size:
+            return h, w
+        k = self.inference_size / max(h, w)
+        return max(1, int(round(h * k))), max(1, int(round(w * k)))
+
+    def _buffers_for(self, h, w):
+        buf = self._buffers.get((h, w))
+        if buf is None:
+            if len(self._buffers) >= 4:
+                self._buffers.clear()  # camera changed resolution; don't hoard stale buffers
+            buf = (np.zeros((h, w, 3), dtype=np.uint8), np.zeros((h, w, 3), dtype=np.uint8))
+            self._buffers[(h, w)] = buf
+        return buf
+
+    def preprocess(self, image_bgr, out_hw=None):
+        """
+        Resize (optional) and convert BGR->RGB into reused buffers.
+        Returns the RGB buffer; it is overwritten by the next call of the same shape.
+        Sets last_scale to the (sx, sy) factors from source to inference pixels.
+        """
+        h, w = image_bgr.shape[:2]
+        th, tw = out_hw if out_hw is not None else self._inference_shape(h, w)
+        bgr, rgb = self._buffers_for(th, tw)
+        if (th, tw) != (h, w):
+            cv2.resize(image_bgr, (tw, th), dst=bgr, interpolation=cv2.INTER_AREA)
+            src = bgr
+        else:
+            src = image_bgr
+        cv2.cvtColor(src, cv2.COLOR_BGR2RGB, dst=rgb)
+        self.last_scale = (tw / w, th / h)
+        return rgb
+
     def process(self, frame_bgr):
-        """Process a frame and return pose results."""
+        """Process a frame and return pose results (landmarks normalized to the full frame)."""
         self._ensure_initialized()
-        # mediapipe expects RGB
-        rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-        return self._pose.process(rgb)
+        roi = self._roi if self.roi_tracking else None
+        if roi is None:
+            # mediapipe expects RGB
+            results = self._pose.process(self.preprocess(frame_bgr))
+        else:
+            x0, y0, x1, y1 = roi
+            crop = frame_bgr[y0:y1, x0:x1]
+            size = self.roi_size if self.roi_size > 0 else crop.shape[0]
+            results = self._pose.process(self.preprocess(crop, out_hw=(size, size)))
+            if results.pose_landmarks is not None:
+                h, w = frame_bgr.shape[:2]
+                self._unmap_roi(results, roi, w, h)
+
+        if self.roi_tracking:
+            self._roi = self._next_roi(results, frame_bgr.shape[1], frame_bgr.shape[0])
+        return results
+
+    @staticmethod
+    def _unmap_roi(results, roi, w, h):
+        """Map crop-normalized landmarks back to full-frame normalized coordinates (in place)."""
+        x0, y0, x1, y1 = roi
+        sx, sy = (x1 - x0) / w, (y1 - y0) / h
+        ox, oy = x0 / w, y0 / h
+        for p in results.pose_landmarks.landmark:
+            p.x = ox + p.x * sx
+            p.y = oy + p.y * sy
+            p.z = p.z * sx  # z shares x's scale in MediaPipe
+
+    def _next_roi(self, results, w, h):
+        """
+        Square, padded box around the current landmarks, or None (full frame) when tracking is lost.
+        The previous ROI is kept while the body still fits inside it, so the model sees a stable
+        image frame instead of a jittering crop.
+        """
+        if results is None or results.pose_landmarks is None:
+            return None
+        pts = np.asarray([[p.x * w, p.y * h] for p in results.pose_landmarks.landmark], dtype=np.float32)
+        bx0, by0 = pts.min(axis=0)
+        bx1, by1 = pts.max(axis=0)
+        size = max(bx1 - bx0, by1 - by0)
+        if not np.isfinite(size) or size < 16:
+            return None
+
+        prev = self._roi
+        if prev is not None:
+            m = 0.5 * self.roi_padding * size
+            if bx0 - m >= prev[0] and by0 - m >= prev[1] and bx1 + m <= prev[2] and by1 + m <= prev[3]:
+                return prev
+
+        side = size * (1.0 + 2.0 * self.roi_padding)
+        if side >= min(w, h):
+            return None  # body fills the frame; cropping would not save anything
+        cx, cy = 0.5 * (bx0 + bx1), 0.5 * (by0 + by1)
+        x0 = int(np.clip(cx - side / 2, 0, w - side))
+        y0 = int(np.clip(cy - side / 2, 0, h - side))
+        s = int(side)
+        return (x0, y0, x0 + s, y0 + s)
 
     def to_landmark_array(self, results):
         """
@@ -116,28 +220,36 @@ class PoseTracker:
 
     @staticmethod
     def draw(frame_bgr, results, ignore_face=True):
-        """Draw only body joints & connections (no face dots/lines)."""
-        if results is None or results.pose_landmarks is None:
+        """
+        Draw only body joints & connections (no face dots/lines).
+        `results` may be MediaPipe results or a (33, >=2) landmark array
+        (e.g. interpolated landmarks for a frame that skipped inference).
+        """
+        if results is None:
             return
-        lm = results.pose_landmarks.landmark
+        if isinstance(results, np.ndarray):
+            pts = results
+        elif results.pose_landmarks is None:
+            return
+        else:
+            pts = np.asarray([[p.x, p.y] for p in results.pose_landmarks.landmark], dtype=np.float32)
         h, w = frame_bgr.shape[:2]
 
         # draw connections we care about
         for a, b in _BODY_CONN:
-            pa, pb = lm[a], lm[b]
-            if any(np.isnan([pa.x, pa.y, pb.x, pb.y])):  # if caller masked face, skip
+            pa, pb = pts[a], pts[b]
+            if np.isnan(pa[:2]).any() or np.isnan(pb[:2]).any():  # if caller masked face, skip
                 continue
-            x1, y1 = int(pa.x * w), int(pa.y * h)
-            x2, y2 = int(pb.x * w), int(pb.y * h)
+            x1, y1 = int(pa[0] * w), int(pa[1] * h)
+            x2, y2 = int(pb[0] * w), int(pb[1] * h)
             cv2.line(frame_bgr, (x1, y1), (x2, y2), (0, 255, 0), 2)
 
         # draw only the joints used by body connections (no face points)
-        used_idxs = {i for conn in _BODY_CONN for i in conn}
-        for i in used_idxs:
-            p = lm[i]
-            if np.isnan([p.x, p.y]).any():
+        for i in _BODY_IDXS:
+            p = pts[i]
+            if np.isnan(p[:2]).any():
                 continue
-            cx, cy = int(p.x * w), int(p.y * h)
+            cx, cy = int(p[0] * w), int(p[1] * h)
             cv2.circle(frame_bgr, (cx, cy), 3, (0, 255, 255), -1)
 
     def close(self):
@@ -147,3 +259,79 @@ class PoseTracker:
             self._pose = None
             self._initialized = False
             log.info("PoseTracker closed")
+
+
+class InferenceScheduler:
+    """
+    Adaptive pose-inference rate.
+
+    While the body is still (mean joint speed below `idle_speed`, in normalized
+    frame units per second), up to `max_skip` consecutive frames skip MediaPipe
+    and get landmarks extrapolated from the last two inferences instead. Any
+    motion switches back to inferring every frame for at least `motion_hold_sec`,
+    so a gesture onset is seen no more than `max_skip` frames late.
+    """
+
+    def __init__(self, idle_speed=0.05, max_skip=1, motion_hold_sec=0.5, max_extrapolate_sec=0.1):
+        self.idle_speed = float(idle_speed)
+        self.max_skip = int(max_skip)
+        self.motion_hold_sec = float(motion_hold_sec)
+        self.max_extrapolate_sec = float(max_extrapolate_sec)
+        self._last = None  # landmarks of the last inferred frame
+        self._last_ts = 0.0
+        self._velocity = None  # per-landmark velocity (units/sec)
+        self._speed = float("inf")
+        self._last_motion_ts = 0.0
+        self._skipped = 0
+        self.inferred = 0
+        self.skipped_total = 0
+
+    def should_infer(self, ts):
+        if self.max_skip <= 0 or self._last is None or self._velocity is None:
+            return True
+        if self._skipped >= self.max_skip:
+            return True
+        if ts - self._last_motion_ts < self.motion_hold_sec:
+            return True
+        return self._speed >= self.idle_speed
+
+    def update(self, landmarks, ts):
+        """Record the landmarks of an inferred frame (None when no pose was found)."""
+        self._skipped = 0
+        self.inferred += 1
+        if landmarks is None:
+            self._last = None
+            self._velocity = None
+            self._speed = float("inf")
+            return
+        if self._last is not None and ts > self._last_ts:
+            vel = (landmarks - self._last) / (ts - self._last_ts)
+            speeds = np.linalg.norm(vel[_FACE_MAX_IDX + 1:, :2], axis=1)
+            self._speed = float(np.nanmean(speeds)) if np.isfinite(speeds).any() else float("inf")
+            self._velocity = vel
+            if self._speed >= self.idle_speed:
+                self._last_motion_ts = ts
+        self._last = landmarks
+        self._last_ts = ts
+
+    def extrapolate(self, ts):
+        """Landmarks for a skipped frame: last inference moved along its velocity."""
+        self._skipped += 1
+        self.skipped_total += 1
+        dt = min(max(0.0, ts - self._last_ts), self.max_extrapolate_sec)
+        return (self._last + self._velocity * dt).astype(np.float32)
+
+
+def track_frame(tracker, scheduler, image, ts):
+    """
+    Pose for one frame: run inference, or extrapolate when the scheduler says the
+    body is idle. Returns (results|None, landmarks|None, inferred).
+    """
+    if scheduler is None or scheduler.should_infer(ts):
+        results = tracker.process(image)
+        landmarks = tracker.to_landmark_array(results)
+        if scheduler is not None:
+            scheduler.update(landmarks, ts)
+        return results, landmarks, True
+    # idle: reuse the motion model instead of running MediaPipe
+    return None, scheduler.extrapolate(ts), False
@@ -0,0 +1,83 @@
+# gamemotion_backend/preview.py
+import time
+import logging
+from typing import Callable
+
+import cv2
+
+from .pose import PoseTracker
+from .metrics import METRICS
+
+log = logging.getLogger("preview")
+
+
+class PreviewEncoder:
+    """
+    Preview stage: downscale, draw the skeleton and JPEG-encode, but only on demand.
+
+    Work happens only while `is_wanted()` reports an active subscriber (or a
+    local window is open). Frames are shrunk to `width` before drawing and
+    encoding, and the JPEG quality is nudged up or down so that one encode
+    stays within `budget_ms` of CPU time.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[bytes], None],
+        is_wanted: Callable[[], bool],
+        width: int = 640,
+        max_fps: float = 15.0,
+        budget_ms: float = 5.0,
+        quality: int = 80,
+        min_quality: int = 40,
+        max_quality: int = 90,
+        local_window: bool = False,
+    ):
+        self._publish = publish
+        self._is_wanted = is_wanted
+        self.width = int(width)
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.budget_ms = float(budget_ms)
+        self.quality = int(quality)
+        self.min_quality = int(min_quality)
+        self.max_quality = int(max_quality)
+        self.local_window = bool(local_window)
+        self.window_frame = None  # latest annotated frame for the local OpenCV window
+        self._last_emit = 0.0
+
+    def _downscale(self, frame):
+        h, w = frame.shape[:2]
+        if self.width <= 0 or w <= self.width:
+            return frame.copy()  # never draw on the shared capture frame
+        height = int(round(h * self.width / w))
+        return cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+
+    def _adapt_quality(self, encode_ms: float):
+        if encode_ms > self.budget_ms and self.quality > self.min_quality:
+            self.quality = max(self.min_quality, self.quality - 5)
+        elif encode_ms < 0.5 * self.budget_ms and self.quality < self.max_quality:
+            self.quality = min(self.max_quality, self.quality + 1)
+
+    def __call__(self, item):
+        now = time.monotonic()
+        encode = self._is_wanted() and now - self._last_emit >= self.min_interval
+        if not (encode or self.local_window):
+            return None
+
+        small = self._downscale(item["frame"].image)
+        if item.get("landmarks") is not None:
+            PoseTracker.draw(small, item["landmarks"])
+        if self.local_window:
+            self.window_frame = small
+        if not encode:
+            return None
+
+        self._last_emit = now
+        t0 = time.perf_counter()
+        ok, jpeg = cv2.imencode(".jpg", small, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        encode_sec = time.perf_counter() - t0
+        METRICS.stage("encode", encode_sec)
+        self._adapt_quality(encode_sec * 1000.0)
+        if ok:
+            self._publish(jpeg.tobytes())
+        return None
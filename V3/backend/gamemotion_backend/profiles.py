@@ -1,19 +1,28 @@
 # gamemotion_backend/profiles.py
 import json
+import logging
 import pathlib
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable
 from .util import PROFILES_DIR
 
+log = logging.getLogger("profiles")
+
 class ProfileManager:
     """
     Loads profiles from profiles/<ExeName>.json.
     Hot-reloads when the file mtime changes so edits in the UI apply immediately.
+
+    With a `compiler` (KeySender.compile) every action mapping is compiled
+    once per load into a macro, and invalid keys are logged then rather than
+    when the action fires; get_macro() returns the compiled action.
     """
-    def __init__(self, base: pathlib.Path = PROFILES_DIR):
+    def __init__(self, base: pathlib.Path = PROFILES_DIR, compiler: Optional[Callable[[dict], Any]] = None):
         self.base = base
         self.base.mkdir(parents=True, exist_ok=True)
+        self.compiler = compiler
         self._cache: Dict[str, Dict[str, Any]] = {}
         self._mtimes: Dict[str, float] = {}
+        self._macros: Dict[str, Dict[str, Any]] = {}
 
     def _path_for_exe(self, exe_name: str) -> pathlib.Path:
         # We store profiles as <ExeName>.json (e.g., Notepad.exe.json)
@@ -32,7 +41,24 @@ class ProfileManager:
                 self._mtimes[exe_name] = mtime
             except Exception:
                 return None
+            self._compile(exe_name)
         return self._cache.get(exe_name)
+
+    def _compile(self, exe_name: str) -> None:
+        if self.compiler is None:
+            return
+        macros = {}
+        for action, mapping in (self._cache[exe_name].get("actions") or {}).items():
+            macro = macros[action] = self.compiler(mapping)
+            for err in getattr(macro, "errors", ()):
+                log.warning(f"{exe_name}: action '{action}' is disabled: {err}")
+        self._macros[exe_name] = macros
+
+    def get_macro(self, exe_name: str, action: str):
+        """Compiled mapping of `action` (None without a compiler, profile or mapping)."""
+        if self.get_profile_for_exe(exe_name) is None:
+            return None
+        return self._macros.get(exe_name, {}).get(action)
     
     def list_profile_names(self):
         """Return profile file stems (e.g., ['Notepad','Minecraft'])."""
@@ -54,3 +80,4 @@ class ProfileManager:
         # Update cache
         self._cache[exe_name] = profile
         self._mtimes[exe_name] = path.stat().st_mtime
+        self._compile(exe_name)
@@ -0,0 +1,112 @@
+# gamemotion_backend/recorder.py
+"""
+Append-only landmark session files (.gmls).
+
+Layout: a 64-byte header followed by fixed-stride records, so a session can be
+opened with np.memmap and sliced without parsing:
+
+    header  : magic b"GMLS", uint16 version, uint16 n_landmarks, uint32 record stride, zero padding
+    record  : float64 ts, uint8 detected, 3 pad bytes, float32 landmarks[n_landmarks][3]
+
+`ts` is the frame's monotonic capture time. Frames without a pose have
+detected=0 and NaN landmarks. A record cut short by a crash is ignored on read.
+"""
+import struct
+import logging
+import pathlib
+import threading
+
+import numpy as np
+
+log = logging.getLogger("recorder")
+
+MAGIC = b"GMLS"
+VERSION = 1
+N_LANDMARKS = 33
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<4sHHI")
+
+RECORD_DTYPE = np.dtype([
+    ("ts", "<f8"),
+    ("detected", "u1"),
+    ("_pad", "u1", (3,)),
+    ("landmarks", "<f4", (N_LANDMARKS, 3)),
+])
+
+
+def _header_bytes() -> bytes:
+    head = _HEADER.pack(MAGIC, VERSION, N_LANDMARKS, RECORD_DTYPE.itemsize)
+    return head + b"\0" * (HEADER_SIZE - len(head))
+
+
+def _check_header(raw: bytes, path) -> None:
+    if len(raw) < _HEADER.size:
+        raise ValueError(f"{path}: not a landmark session (file too short)")
+    magic, version, n_lm, stride = _HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a landmark session (bad magic)")
+    if version != VERSION or n_lm != N_LANDMARKS or stride != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path}: unsupported session format v{version} ({n_lm} landmarks, stride {stride})")
+
+
+class LandmarkRecorder:
+    """Streams (ts, detected, landmarks) records to an append-only .gmls file."""
+
+    def __init__(self, path, flush_every: int = 60):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        exists = self.path.exists() and self.path.stat().st_size > 0
+        if exists:
+            with open(self.path, "rb") as f:
+                _check_header(f.read(HEADER_SIZE), self.path)
+            self._truncate_partial()
+        self._f = open(self.path, "ab")
+        if not exists:
+            self._f.write(_header_bytes())
+        self._rec = np.zeros(1, dtype=RECORD_DTYPE)  # reused for every write
+        self._lock = threading.Lock()
+        self.flush_every = int(flush_every)
+        self.count = 0
+        log.info(f"Recording landmarks to {self.path}")
+
+    def _truncate_partial(self):
+        size = self.path.stat().st_size
+        extra = (size - HEADER_SIZE) % RECORD_DTYPE.itemsize
+        if extra:
+            with open(self.path, "r+b") as f:
+                f.truncate(size - extra)
+
+    def write(self, ts: float, landmarks) -> None:
+        with self._lock:
+            rec = self._rec[0]
+            rec["ts"] = ts
+            if landmarks is None:
+                rec["detected"] = 0
+                rec["landmarks"] = np.nan
+            else:
+                rec["detected"] = 1
+                rec["landmarks"] = landmarks
+            self._f.write(self._rec.tobytes())
+            self.count += 1
+            if self.flush_every > 0 and self.count % self.flush_every == 0:
+                self._f.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._f.closed:
+                self._f.close()
+                log.info(f"Recorded {self.count} frames to {self.path}")
+
+
+def open_session(path) -> np.ndarray:
+    """
+    Memory-map a .gmls file as a structured array with fields ts, detected and
+    landmarks (shape (T, 33, 3)). Nothing is read until fields are accessed.
+    """
+    path = pathlib.Path(path)
+    with open(path, "rb") as f:
+        _check_header(f.read(HEADER_SIZE), path)
+    n = (path.stat().st_size - HEADER_SIZE) // RECORD_DTYPE.itemsize
+    if n <= 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(n,))
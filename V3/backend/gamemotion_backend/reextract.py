@@ -0,0 +1,143 @@
+# gamemotion_backend/reextract.py
+"""
+Rebuild stored sample features from their saved landmarks after the feature
+extractor changes (features.FEATURE_VERSION was bumped). Workers read the
+landmarks straight from each game's memory-mapped store; the new features are
+written back as one compaction per game.
+
+    python -m gamemotion_backend.reextract               # stale samples, all games
+    python -m gamemotion_backend.reextract --all -j 4    # every sample, 4 worker processes
+
+The API exposes the same job: POST /features/reextract starts it in the
+background and GET /features/reextract reports progress.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import pathlib
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .features import FEATURE_VERSION, extract_angle_signatures
+from .store import PackedStore, open_store, game_dirs
+from .util import DATA_DIR
+
+log = logging.getLogger("reextract")
+
+CHUNK = 1024  # samples per worker task
+
+
+def _extract_rows(landmarks_path: str, rows: List[int]) -> Tuple[List[int], np.ndarray]:
+    """Worker: batch-extract signatures for some rows of a store's landmarks matrix."""
+    lms = np.load(landmarks_path, mmap_mode="r")
+    return rows, extract_angle_signatures(np.asarray(lms[rows]))
+
+
+class ReextractJob:
+    """
+    Background re-extraction over all games with a process pool.
+    `status()` is safe to call from any thread while the job runs.
+    """
+
+    def __init__(self, base: Optional[pathlib.Path] = None, workers: Optional[int] = None, stale_only: bool = True):
+        self.base = pathlib.Path(base) if base else pathlib.Path(DATA_DIR)
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.stale_only = stale_only
+        self._state = {"state": "idle", "total": 0, "done": 0, "failed": 0,
+                       "feature_version": FEATURE_VERSION, "started": None, "finished": None, "error": None}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self) -> dict:
+        with self._lock:
+            st = dict(self._state)
+        processed = st["done"] + st["failed"]
+        st["progress"] = round(processed / st["total"], 4) if st["total"] else (1.0 if st["state"] == "finished" else 0.0)
+        return st
+
+    def _update(self, **kw) -> None:
+        with self._lock:
+            self._state.update(kw)
+
+    def start(self) -> "ReextractJob":
+        if self.running:
+            raise RuntimeError("re-extraction is already running")
+        self._thread = threading.Thread(target=self.run, name="reextract", daemon=True)
+        self._thread.start()
+        return self
+
+    def _plan(self, store: PackedStore) -> Tuple[np.ndarray, int]:
+        """Rows of one store to rebuild, and how many of the selected rows lack landmarks."""
+        store.compact()  # journal rows need a row in the landmarks file
+        view = store.snapshot()
+        selected = np.ones(len(view), dtype=bool)
+        if self.stale_only:
+            selected &= view.column("versions") != FEATURE_VERSION
+        usable = np.isfinite(view.column("landmarks")[:, :, :2]).all(axis=(1, 2))
+        return np.flatnonzero(selected & usable), int((selected & ~usable).sum())
+
+    def run(self) -> dict:
+        self._update(state="scanning", started=time.time(), finished=None, error=None, done=0, failed=0)
+        try:
+            stores = [open_store(d) for d in game_dirs(self.base)]
+            plans = [(s, *self._plan(s)) for s in stores]
+            total = sum(len(rows) + missing for _, rows, missing in plans)
+            self._update(state="running", total=total, failed=sum(m for _, _, m in plans))
+            log.info(f"Re-extracting {total} samples in {len(stores)} games with {self.workers} workers "
+                     f"(feature v{FEATURE_VERSION})")
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for store, rows, missing in plans:
+                    if not len(rows):
+                        continue
+                    with store.compaction_lock:
+                        # samples may have arrived, or been rebuilt by another job, since the scan
+                        new_rows, new_missing = self._plan(store)
+                        with self._lock:
+                            self._state["total"] += len(new_rows) + new_missing - len(rows) - missing
+                            self._state["failed"] += new_missing - missing
+                        rows = new_rows
+                        if not len(rows):
+                            continue
+                        path = str(store.path_of("landmarks"))
+                        chunks = [rows[i:i + CHUNK].tolist() for i in range(0, len(rows), CHUNK)]
+                        done_rows, feats = [], []
+                        for fut in as_completed([pool.submit(_extract_rows, path, c) for c in chunks]):
+                            r, f = fut.result()
+                            done_rows.extend(r)
+                            feats.append(f)
+                            with self._lock:
+                                self._state["done"] += len(r)
+                        store.compact(replace=(np.asarray(done_rows), np.concatenate(feats)))
+            self._update(state="finished", finished=time.time())
+            st = self.status()
+            log.info(f"Re-extraction finished: {st['done']} rebuilt, {st['failed']} without usable landmarks")
+        except Exception as e:
+            log.exception("Re-extraction failed")
+            self._update(state="failed", finished=time.time(), error=str(e))
+        return self.status()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Rebuild stored sample features from their landmarks")
+    ap.add_argument("--data", type=str, default=str(DATA_DIR))
+    ap.add_argument("--all", action="store_true", help="Re-extract every sample, not only stale ones")
+    ap.add_argument("-j", "--workers", type=int, default=None)
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    st = ReextractJob(pathlib.Path(args.data), workers=args.workers, stale_only=not args.all).run()
+    print(json.dumps(st, indent=2))
+    return 0 if st["state"] == "finished" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
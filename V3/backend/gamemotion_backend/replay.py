@@ -0,0 +1,208 @@
+# gamemotion_backend/replay.py
+"""
+Offline replay: run the detection path against a video file or a recorded
+landmark session instead of a live camera.
+
+    python -m gamemotion_backend.main --source clip.mp4 --game Minecraft.exe
+    python -m gamemotion_backend.main --source session.gmls --game Minecraft.exe --realtime
+
+Nothing is sent to the keyboard; fire decisions are reported instead, together
+with throughput, per-frame decision latency and (for videos) pose latency.
+"""
+import json
+import time
+import logging
+import pathlib
+from typing import Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .pose import PoseTracker, InferenceScheduler, track_frame
+from .features import extract_angle_signature, TemporalFeatureWindow
+from .actions import ActionRecognizer
+from .dtw import DTWMatcher, open_templates
+from .decision import FireDecider, HoldState
+from .profiles import ProfileManager
+from .recorder import open_session
+from .util import DATA_DIR
+
+log = logging.getLogger("replay")
+
+LANDMARK_SUFFIXES = {".npz", ".gmls"}
+
+
+def _iter_landmarks(path: pathlib.Path) -> Iterator[Tuple[float, Optional[np.ndarray]]]:
+    """
+    Recorded landmark session: a .gmls recording (see recorder.py), or an npz
+    with `landmarks` (T,33,3) and optional `ts` (T,) / `detected` (T,).
+    """
+    if path.suffix.lower() == ".gmls":
+        rec = open_session(path)
+        for i in range(len(rec)):
+            yield float(rec["ts"][i]), (np.array(rec["landmarks"][i]) if rec["detected"][i] else None)
+        return
+    with np.load(path) as z:
+        lms = z["landmarks"].astype(np.float32)
+        ts = z["ts"].astype(np.float64) if "ts" in z else np.arange(len(lms)) / 30.0
+        detected = z["detected"].astype(bool) if "detected" in z else np.isfinite(lms[:, 11:, :2]).all(axis=(1, 2))
+    for i in range(len(lms)):
+        yield float(ts[i]), (lms[i] if detected[i] else None)
+
+
+def _iter_video(path: pathlib.Path, tracker: PoseTracker, scheduler: Optional[InferenceScheduler],
+                pose_ms: Optional[list] = None):
+    """Decoded frames through pose tracking; each frame's tracking time is appended to `pose_ms`."""
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        raise FileNotFoundError(f"cannot open video source: {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    i = 0
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            ts = i / fps
+            i += 1
+            t0 = time.perf_counter()
+            _, landmarks, _ = track_frame(tracker, scheduler, frame, ts)
+            if pose_ms is not None:
+                pose_ms.append((time.perf_counter() - t0) * 1000.0)
+            yield ts, landmarks
+    finally:
+        cap.release()
+
+
+def _percentiles(values_ms):
+    if not values_ms:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    arr = np.asarray(values_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3),
+            "p99": round(float(p99), 3), "max": round(float(arr.max()), 3)}
+
+
+def run_replay(source, exe_name: Optional[str], cfg: dict, realtime: bool = False,
+               complexity: int = 0, report_path: Optional[str] = None) -> dict:
+    """
+    Replay `source` through pose -> features -> classify_offline -> firing rule.
+    Decision latency is measured from the moment a frame's landmarks are
+    available (after the --realtime wait) to the moment the firing decision
+    for it is made, the same in both modes. For video sources pose inference
+    is timed separately and reported as pose_latency_ms.
+    """
+    path = pathlib.Path(source)
+    temporal = bool(cfg.get("temporal_features", False))
+    recognizer = ActionRecognizer(exe_name, offline_threshold=float(cfg.get("offline_threshold", 0.82)),
+                                  temporal=temporal, backend=cfg.get("classifier", "centroid"),
+                                  backend_opts=cfg.get("classifier_opts", {})) if exe_name else None
+    motion = TemporalFeatureWindow(size=int(cfg.get("temporal_window", 8)))
+    matcher = DTWMatcher(open_templates(DATA_DIR / exe_name), band=float(cfg.get("dtw_band", 0.25)),
+                         min_score=float(cfg.get("dtw_min_score", 0.5))) if exe_name else None
+    decider = FireDecider.from_config(cfg)
+    if recognizer:
+        decider.label_thresholds = recognizer.label_thresholds(float(cfg.get("strict_quantile", 0.9)),
+                                                               int(cfg.get("min_samples_per_action", 10)))
+    prof = ProfileManager().get_profile_for_exe(exe_name) if exe_name else None
+    mapped = set(prof.get("actions", {}).keys()) if prof else None
+    hold_labels = {lbl for lbl, m in prof.get("actions", {}).items() if m.get("mode") == "hold"} if prof else set()
+    holds = HoldState(release_threshold=float(cfg.get("release_threshold", 0.9)),
+                      rearm_frames=int(cfg.get("rearm_frames", 6)),
+                      release_margin=float(cfg.get("release_margin", 0.02)))
+
+    tracker = None
+    pose_ms = []
+    if path.suffix.lower() in LANDMARK_SUFFIXES:
+        frames = _iter_landmarks(path)
+    else:
+        tracker = PoseTracker(
+            complexity=complexity,
+            min_det=cfg.get("min_detection_confidence", 0.5),
+            min_track=cfg.get("min_tracking_confidence", 0.5),
+            roi_tracking=cfg.get("roi_tracking", False),
+            roi_padding=cfg.get("roi_padding", 0.25),
+            roi_size=cfg.get("roi_size", 256),
+            inference_size=cfg.get("inference_size", 0),
+        )
+        scheduler = None
+        if cfg.get("adaptive_inference", True):
+            scheduler = InferenceScheduler(idle_speed=cfg.get("idle_speed", 0.05),
+                                           max_skip=cfg.get("idle_max_skip", 1),
+                                           motion_hold_sec=cfg.get("motion_hold_sec", 0.5))
+        frames = _iter_video(path, tracker, scheduler, pose_ms)
+
+    log.info(f"Replaying {path} (exe={exe_name}, realtime={realtime})")
+    n = detected = 0
+    latencies = []
+    fires = []
+    ts0 = None
+    wall0 = time.perf_counter()
+    try:
+        for ts, landmarks in frames:
+            if ts0 is None:
+                ts0 = ts
+            if realtime:
+                delay = (ts - ts0) - (time.perf_counter() - wall0)
+                if delay > 0:
+                    time.sleep(delay)
+            t_ready = time.perf_counter()
+
+            label_to_fire = None
+            best = second = 0.0
+            released = None
+            if landmarks is None:
+                released = holds.release()
+                motion.reset()
+                if matcher:
+                    matcher.reset()
+            else:
+                detected += 1
+                sig = extract_angle_signature(landmarks)
+                motion_feats = motion.update(sig)
+                feats = np.concatenate([sig, motion_feats]) if temporal else sig
+                if recognizer:
+                    label, best, second = recognizer.classify_offline(feats)
+                    dyn = matcher.push(sig)
+                    if dyn[0] is not None:
+                        label, best, second = dyn
+                    released = holds.update(label, best, calibrated=dyn[0] is None)
+                    label_to_fire = decider.update(label, best, second, ts, calibrated=dyn[0] is None)
+            if released:
+                fires.append({"frame": n, "ts": round(ts, 4), "label": released[0], "event": "release"})
+            if label_to_fire in hold_labels:
+                if holds.can_press(label_to_fire):
+                    prev = holds.release()
+                    if prev:
+                        fires.append({"frame": n, "ts": round(ts, 4), "label": prev[0], "event": "release"})
+                    holds.press(label_to_fire, floor=decider.floor(label_to_fire, second <= -1.0))
+                    fires.append({"frame": n, "ts": round(ts, 4), "label": label_to_fire, "event": "press",
+                                  "score": round(float(best), 4)})
+            elif label_to_fire and (mapped is None or label_to_fire in mapped):
+                decider.fired(ts)
+                fires.append({"frame": n, "ts": round(ts, 4), "label": label_to_fire, "score": round(float(best), 4)})
+
+            latencies.append((time.perf_counter() - t_ready) * 1000.0)
+            n += 1
+    finally:
+        if tracker is not None:
+            tracker.close()
+
+    elapsed = time.perf_counter() - wall0
+    report = {
+        "source": str(path),
+        "exe": exe_name,
+        "realtime": bool(realtime),
+        "frames": n,
+        "detected": detected,
+        "elapsed_sec": round(elapsed, 3),
+        "fps": round(n / elapsed, 2) if elapsed > 0 else 0.0,
+        "decision_latency_ms": _percentiles(latencies),
+        "pose_latency_ms": _percentiles(pose_ms) if tracker is not None else None,
+        "fires": fires,
+    }
+    log.info(f"Replay done: {n} frames in {elapsed:.2f}s ({report['fps']} fps), {len(fires)} fires, "
+             f"decision p95={report['decision_latency_ms']['p95']}ms")
+    if report_path:
+        pathlib.Path(report_path).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return report
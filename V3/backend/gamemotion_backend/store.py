@@ -0,0 +1,436 @@
+# gamemotion_backend/store.py
+"""
+Packed, memory-mapped sample store (one per game).
+
+    data/<exe>/.store/
+        meta.json               generation, label names, feature dim, last compacted journal seq
+        features.<gen>.npy      (N,d)    float32
+        labels.<gen>.npy        (N,)     int32    index into meta["labels"]
+        versions.<gen>.npy      (N,)     int32    features.FEATURE_VERSION of each row
+        temporal.<gen>.npy      (N,3d)   float32  zeros: sample recorded without motion features
+        landmarks.<gen>.npy     (N,33,3) float32  NaN: sample saved without landmarks
+        images.<gen>.json       [str]             captured jpg of each row
+        journal.jsonl           samples appended since the last compaction
+
+New samples are appended to the journal and served from memory until a
+background compaction folds them into a new generation of .npy files; meta.json
+is replaced last, so a crash at any point leaves a consistent store. Rows are
+never removed or reordered, so a row index stays valid across compactions.
+
+    python -m gamemotion_backend.store migrate [--remove]   # pack legacy data/<exe>/<action>/*.npz trees
+    python -m gamemotion_backend.store compact
+    python -m gamemotion_backend.store info
+"""
+import os
+import sys
+import json
+import logging
+import pathlib
+import argparse
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .features import FEATURE_VERSION
+from .util import DATA_DIR
+
+log = logging.getLogger("store")
+
+STORE_DIR = ".store"
+N_LANDMARKS = 33
+COLUMNS = ("features", "labels", "versions", "temporal", "landmarks")
+
+
+def sample_version(z) -> int:
+    """Feature version of an opened sample npz; untagged samples predate versioning (version 1)."""
+    return int(z["feature_version"]) if "feature_version" in z.files else 1
+
+
+def _fit(vec: np.ndarray, d: int) -> np.ndarray:
+    """Zero-pad or cut a feature row to width d (only stale-version rows ever differ)."""
+    vec = np.asarray(vec, dtype=np.float32).ravel()
+    if vec.size == d:
+        return vec
+    out = np.zeros(d, dtype=np.float32)
+    out[:min(d, vec.size)] = vec[:d]
+    return out
+
+
+def _atomic_write(path: pathlib.Path, write) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        write(fh)
+    os.replace(tmp, path)
+
+
+class Row:
+    """One journal record, already converted to arrays."""
+    __slots__ = ("seq", "label", "features", "version", "temporal", "landmarks", "image")
+
+    def __init__(self, seq, label, features, version, temporal, landmarks, image):
+        self.seq = seq
+        self.label = label
+        self.features = features
+        self.version = version
+        self.temporal = temporal
+        self.landmarks = landmarks
+        self.image = image
+
+    @classmethod
+    def from_json(cls, rec: dict) -> "Row":
+        f = np.asarray(rec["features"], dtype=np.float32)
+        t = rec.get("temporal")
+        lm = rec.get("landmarks")
+        return cls(int(rec["seq"]), str(rec["label"]), f, int(rec.get("version", 1)),
+                   np.asarray(t, dtype=np.float32) if t else None,
+                   np.asarray(lm, dtype=np.float32).reshape(N_LANDMARKS, 3) if lm else None,
+                   str(rec.get("image", "")))
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "seq": self.seq, "label": self.label, "version": self.version, "image": self.image,
+            "features": self.features.tolist(),
+            "temporal": self.temporal.tolist() if self.temporal is not None else None,
+            "landmarks": self.landmarks.tolist() if self.landmarks is not None else None,
+        })
+
+
+class StoreView:
+    """
+    Read-only snapshot: the memory-mapped base generation plus journal rows.
+    Columns are only materialised when asked for; with an empty journal they
+    are the memmaps themselves.
+    """
+
+    def __init__(self, meta: dict, base: Dict[str, np.ndarray], images: List[str], pending: List[Row], seq: int):
+        self.seq = seq  # last journal sequence number included
+        self.base = base
+        self.pending = pending
+        self._images = images
+        self.label_names: List[str] = list(meta.get("labels", []))
+        for r in pending:
+            if r.label not in self.label_names:
+                self.label_names.append(r.label)
+        self.dim = int(pending[-1].features.size if pending else meta.get("dim", 0))
+        self._cols: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.base["labels"]) + len(self.pending)
+
+    def column(self, name: str) -> np.ndarray:
+        col = self._cols.get(name)
+        if col is not None:
+            return col
+        d = self.dim
+        base = self.base[name]
+        if name == "features" and base.shape[1] != d:
+            base = np.stack([_fit(r, d) for r in base]) if len(base) else np.zeros((0, d), np.float32)
+        elif name == "temporal" and base.shape[1] != 3 * d:
+            base = np.stack([_fit(r, 3 * d) for r in base]) if len(base) else np.zeros((0, 3 * d), np.float32)
+        if not self.pending:
+            col = base
+        else:
+            ids = {n: i for i, n in enumerate(self.label_names)}
+            if name == "features":
+                rows = np.stack([_fit(r.features, d) for r in self.pending])
+            elif name == "labels":
+                rows = np.array([ids[r.label] for r in self.pending], dtype=np.int32)
+            elif name == "versions":
+                rows = np.array([r.version for r in self.pending], dtype=np.int32)
+            elif name == "temporal":
+                rows = np.stack([_fit(r.temporal, 3 * d) if r.temporal is not None and r.temporal.size
+                                 else np.zeros(3 * d, np.float32) for r in self.pending])
+            elif name == "landmarks":
+                rows = np.stack([r.landmarks if r.landmarks is not None
+                                 else np.full((N_LANDMARKS, 3), np.nan, np.float32) for r in self.pending])
+            else:
+                raise KeyError(name)
+            col = np.concatenate([base, rows]) if len(base) else rows
+        self._cols[name] = col
+        return col
+
+    def images(self) -> List[str]:
+        return self._images + [r.image for r in self.pending]
+
+
+class PackedStore:
+    """
+    Sample store of one game. Use open_store() so every caller in the process
+    shares one instance (and one journal writer) per directory.
+    """
+
+    def __init__(self, exe_dir: pathlib.Path, compact_every: int = 256):
+        self.exe_dir = pathlib.Path(exe_dir)
+        self.root = self.exe_dir / STORE_DIR
+        self.compact_every = int(compact_every)
+        self.revision = 0  # bumped on every append/compaction; cheap cache key for readers
+        self._lock = threading.RLock()
+        # held across a compaction; re-extraction holds it from reading the
+        # landmarks file until its rewrite, so that generation stays on disk
+        self.compaction_lock = threading.RLock()
+        self._compacting = False
+        self._view: Optional[StoreView] = None
+        self._listeners: List[Callable[[str, Optional[Row]], None]] = []
+        self._load()
+
+    def add_listener(self, fn: Callable[[str, Optional[Row]], None]) -> None:
+        """
+        fn(event, row) runs on the writing thread after each change:
+        ("append", row) for a new sample, ("rewrite", None) when existing rows'
+        features were replaced. Row seq numbers let a listener skip rows it
+        already saw in a snapshot (StoreView.seq).
+        """
+        with self._lock:
+            self._listeners = self._listeners + [fn]
+
+    def remove_listener(self, fn: Callable[[str, Optional[Row]], None]) -> None:
+        with self._lock:
+            self._listeners = [f for f in self._listeners if f != fn]
+
+    def _notify(self, event: str, row: Optional[Row]) -> None:
+        for fn in self._listeners:
+            try:
+                fn(event, row)
+            except Exception:
+                log.exception(f"Store listener failed on {event}")
+
+    # ---- disk ----
+    @property
+    def journal_path(self) -> pathlib.Path:
+        return self.root / "journal.jsonl"
+
+    def path_of(self, column: str, gen: Optional[int] = None) -> pathlib.Path:
+        gen = self._meta["generation"] if gen is None else gen
+        ext = "json" if column == "images" else "npy"
+        return self.root / f"{column}.{gen}.{ext}"
+
+    def _load(self) -> None:
+        meta_path = self.root / "meta.json"
+        if meta_path.exists():
+            self._meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        else:
+            self._meta = {"generation": 0, "seq": 0, "dim": 0, "labels": [], "count": 0}
+        self._open_base()
+        self._pending: List[Row] = []
+        self._seq = int(self._meta["seq"])
+        if self.journal_path.exists():
+            with open(self.journal_path, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        row = Row.from_json(json.loads(line))
+                    except Exception:
+                        continue  # line cut short by a crash
+                    if row.seq > self._meta["seq"]:
+                        self._pending.append(row)
+                        self._seq = max(self._seq, row.seq)
+        self._sweep()
+
+    def _open_base(self) -> None:
+        if self._meta["generation"] == 0:
+            d = int(self._meta.get("dim", 0))
+            self._base = {
+                "features": np.zeros((0, d), np.float32),
+                "labels": np.zeros(0, np.int32),
+                "versions": np.zeros(0, np.int32),
+                "temporal": np.zeros((0, 3 * d), np.float32),
+                "landmarks": np.zeros((0, N_LANDMARKS, 3), np.float32),
+            }
+            self._images: List[str] = []
+            return
+        self._base = {c: np.load(self.path_of(c), mmap_mode="r") for c in COLUMNS}
+        self._images = json.loads(self.path_of("images").read_text(encoding="utf-8"))
+
+    def _sweep(self) -> None:
+        """Delete files of older generations (they may still be mapped on Windows; retried next time)."""
+        if not self.root.exists():
+            return
+        current = self._meta["generation"]
+        for f in self.root.iterdir():
+            parts = f.name.split(".")
+            if len(parts) == 3 and parts[1].isdigit() and int(parts[1]) != current:
+                try:
+                    f.unlink()
+                except OSError:
+                    pass
+
+    # ---- writes ----
+    def append(self, label: str, features: np.ndarray, image: str = "",
+               landmarks: Optional[np.ndarray] = None, temporal: Optional[np.ndarray] = None,
+               version: int = FEATURE_VERSION) -> None:
+        lm = None
+        if landmarks is not None and np.asarray(landmarks).size >= N_LANDMARKS * 3:
+            lm = np.asarray(landmarks, dtype=np.float32)[:N_LANDMARKS, :3]
+        tmp = np.asarray(temporal, dtype=np.float32).ravel() if temporal is not None else None
+        with self._lock:
+            self._seq += 1
+            row = Row(self._seq, label, np.asarray(features, dtype=np.float32).ravel(), int(version),
+                       tmp if tmp is not None and tmp.size else None, lm, str(image))
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.journal_path, "a", encoding="utf-8") as fh:
+                fh.write(row.to_json() + "\n")
+            self._pending.append(row)
+            self._view = None
+            self.revision += 1
+            backlog = len(self._pending)
+        self._notify("append", row)
+        if self.compact_every > 0 and backlog >= self.compact_every:
+            self.compact_async()
+
+    def compact_async(self) -> None:
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, name="store-compact", daemon=True).start()
+
+    def compact(self, replace: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> bool:
+        """
+        Fold the journal into a new generation. `replace=(rows, features)`
+        also overwrites those rows' features as current-version; used by
+        re-extraction. Temporal features came from the live frame window and
+        cannot be rebuilt, so they are kept for rows already at the current
+        version and cleared for stale ones (all rows if the width changed).
+        """
+        with self.compaction_lock:
+            try:
+                with self._lock:
+                    view = self.snapshot()
+                    upto = self._seq
+                if not view.pending and replace is None:
+                    return False
+                cols = {c: np.array(view.column(c)) for c in COLUMNS}
+                if replace is not None:
+                    rows, feats = replace
+                    rows = np.asarray(rows, dtype=np.intp)
+                    feats = np.asarray(feats, dtype=np.float32)
+                    if feats.shape[1] != cols["features"].shape[1]:
+                        # the extractor changed width: every other row is stale and gets refitted
+                        d = feats.shape[1]
+                        cols["features"] = np.stack([_fit(r, d) for r in cols["features"]]) if len(cols["features"]) \
+                            else np.zeros((0, d), np.float32)
+                        cols["temporal"] = np.zeros((len(cols["features"]), 3 * d), np.float32)
+                    stale = rows[cols["versions"][rows] != FEATURE_VERSION]
+                    cols["temporal"][stale] = 0.0
+                    cols["features"][rows] = feats
+                    cols["versions"][rows] = FEATURE_VERSION
+                images = view.images()
+
+                gen = int(self._meta["generation"]) + 1
+                self.root.mkdir(parents=True, exist_ok=True)
+                for c in COLUMNS:
+                    _atomic_write(self.path_of(c, gen), lambda fh, a=cols[c]: np.save(fh, a))
+                _atomic_write(self.path_of("images", gen), lambda fh: fh.write(json.dumps(images).encode("utf-8")))
+                meta = {"generation": gen, "seq": upto, "dim": int(cols["features"].shape[1]),
+                        "labels": view.label_names, "count": len(view), "feature_version": FEATURE_VERSION}
+                _atomic_write(self.root / "meta.json", lambda fh: fh.write(json.dumps(meta, indent=2).encode("utf-8")))
+
+                with self._lock:
+                    self._meta = meta
+                    self._open_base()
+                    self._pending = [r for r in self._pending if r.seq > upto]
+                    rest = "".join(r.to_json() + "\n" for r in self._pending)
+                    _atomic_write(self.journal_path, lambda fh: fh.write(rest.encode("utf-8")))
+                    self._view = None
+                    self.revision += 1
+                self._sweep()
+                log.info(f"Compacted {self.exe_dir.name}: {meta['count']} samples (generation {gen})")
+                if replace is not None:
+                    self._notify("rewrite", None)
+                return True
+            finally:
+                with self._lock:
+                    self._compacting = False
+
+    # ---- reads ----
+    def snapshot(self) -> StoreView:
+        with self._lock:
+            if self._view is None:
+                self._view = StoreView(self._meta, self._base, self._images, list(self._pending), self._seq)
+            return self._view
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._base["labels"]) + len(self._pending)
+
+    # ---- legacy ----
+    def legacy_files(self) -> List[pathlib.Path]:
+        return sorted(self.exe_dir.glob("*/*.npz"), key=lambda p: p.name)
+
+    def migrate_legacy(self, remove: bool = False) -> int:
+        """Pack data/<exe>/<action>/*.npz into this store (only into an empty store)."""
+        files = self.legacy_files()
+        if not files:
+            return 0
+        if len(self):
+            log.warning(f"{self.exe_dir.name}: store already has samples; skipped {len(files)} legacy npz files")
+            return 0
+        n = 0
+        every, self.compact_every = self.compact_every, 0  # one compaction at the end
+        for f in files:
+            try:
+                with np.load(f, allow_pickle=True) as z:
+                    temporal = z["temporal"] if "temporal" in z.files else None
+                    self.append(f.parent.name, z["features"], str(z["image"]) if "image" in z.files else "",
+                                landmarks=z["landmarks"] if z["landmarks"].ndim == 2 else None,
+                                temporal=temporal, version=sample_version(z))
+                n += 1
+            except Exception:
+                log.warning(f"Skipping unreadable sample {f}")
+        self.compact_every = every
+        self.compact()
+        if remove:
+            for f in files:
+                f.unlink(missing_ok=True)
+        log.info(f"Migrated {n} legacy samples for {self.exe_dir.name}")
+        return n
+
+
+_STORES: Dict[str, PackedStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def open_store(exe_dir, migrate: bool = True) -> PackedStore:
+    """Shared store for data/<exe>; a legacy npz tree is packed on first open."""
+    key = str(pathlib.Path(exe_dir).resolve())
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = PackedStore(pathlib.Path(exe_dir))
+            if migrate and not len(store) and store.legacy_files():
+                store.migrate_legacy()
+    return store
+
+
+def game_dirs(base=None) -> List[pathlib.Path]:
+    base = pathlib.Path(base) if base else pathlib.Path(DATA_DIR)
+    if not base.exists():
+        return []
+    return sorted(d for d in base.iterdir() if d.is_dir() and ((d / STORE_DIR).exists() or any(d.glob("*/*.npz"))))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="GameMotion sample store maintenance")
+    ap.add_argument("command", choices=["migrate", "compact", "info"])
+    ap.add_argument("--data", type=str, default=str(DATA_DIR))
+    ap.add_argument("--remove", action="store_true", help="migrate: delete the npz files once packed")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    report = {}
+    for d in game_dirs(args.data):
+        store = open_store(d, migrate=False)
+        if args.command == "migrate":
+            report[d.name] = {"migrated": store.migrate_legacy(remove=args.remove)}
+        elif args.command == "compact":
+            report[d.name] = {"compacted": store.compact()}
+        view = store.snapshot()
+        report.setdefault(d.name, {}).update({
+            "samples": len(view), "journal": len(view.pending), "labels": view.label_names, "dim": view.dim,
+        })
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
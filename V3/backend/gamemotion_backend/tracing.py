@@ -0,0 +1,157 @@
+# gamemotion_backend/tracing.py
+"""
+In-process diagnostics that work on a user's machine without external tools.
+
+- TRACER records spans (pipeline stages, background threads) as Chrome
+  trace events; open the written JSON in chrome://tracing or ui.perfetto.dev.
+- SamplingProfiler periodically snapshots every thread's Python stack and
+  writes collapsed stacks ("thread;outer;inner count"), the input format of
+  flamegraph.pl and speedscope.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import pathlib
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict
+
+log = logging.getLogger("tracing")
+
+
+class Tracer:
+    """Collects complete ("X") trace events into a bounded buffer while enabled."""
+
+    def __init__(self, max_events: int = 500_000):
+        self.enabled = False
+        self._events = deque(maxlen=int(max_events))
+        self._t0 = time.perf_counter_ns()
+        self._pid = os.getpid()
+        self._threads: Dict[int, str] = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def now_us(self) -> float:
+        return (time.perf_counter_ns() - self._t0) / 1000.0
+
+    @contextmanager
+    def span(self, name: str, cat: str = "stage", **args):
+        if not self.enabled:
+            yield
+            return
+        start = self.now_us()
+        try:
+            yield
+        finally:
+            self.complete(name, start, self.now_us() - start, cat=cat, **args)
+
+    def complete(self, name: str, start_us: float, dur_us: float, cat: str = "stage", **args) -> None:
+        if not self.enabled:
+            return
+        t = threading.current_thread()
+        self._threads.setdefault(t.ident, t.name)
+        ev = {"name": name, "cat": cat, "ph": "X", "ts": start_us, "dur": dur_us, "pid": self._pid, "tid": t.ident}
+        if args:
+            ev["args"] = args
+        self._events.append(ev)
+
+    def instant(self, name: str, cat: str = "event", **args) -> None:
+        if not self.enabled:
+            return
+        t = threading.current_thread()
+        self._threads.setdefault(t.ident, t.name)
+        ev = {"name": name, "cat": cat, "ph": "i", "s": "t", "ts": self.now_us(), "pid": self._pid, "tid": t.ident}
+        if args:
+            ev["args"] = args
+        self._events.append(ev)
+
+    def export(self) -> dict:
+        """Chrome trace-event document for everything recorded so far."""
+        events = list(self._events)
+        meta = [
+            {"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid, "args": {"name": name}}
+            for tid, name in list(self._threads.items())
+        ]
+        meta.append({"name": "process_name", "ph": "M", "pid": self._pid, "args": {"name": "GameMotion backend"}})
+        return {"traceEvents": meta + events, "displayTimeUnit": "ms"}
+
+    def write(self, path) -> int:
+        """Write the Chrome trace-event JSON; returns the number of events."""
+        doc = self.export()
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(doc), encoding="utf-8")
+        n = len(doc["traceEvents"])
+        log.info(f"Wrote {n} trace events to {path}")
+        return n
+
+
+TRACER = Tracer()
+
+
+class SamplingProfiler:
+    """
+    Samples all threads' Python stacks every `interval` seconds for `seconds`.
+    Only one run at a time; the sampling thread excludes itself.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = float(interval)
+        self.max_depth = int(max_depth)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def run(self, seconds: float) -> "SamplingProfiler":
+        if not SamplingProfiler._lock.acquire(blocking=False):
+            raise RuntimeError("a profiling run is already in progress")
+        try:
+            me = threading.get_ident()
+            deadline = time.perf_counter() + float(seconds)
+            while time.perf_counter() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for tid, frame in sys._current_frames().items():
+                    if tid == me:
+                        continue
+                    parts = []
+                    while frame is not None and len(parts) < self.max_depth:
+                        code = frame.f_code
+                        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    parts.append(names.get(tid, str(tid)))
+                    self.stacks[";".join(reversed(parts))] += 1
+                self.samples += 1
+                time.sleep(self.interval)
+        finally:
+            SamplingProfiler._lock.release()
+        return self
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def top(self, n: int = 20):
+        """Leaf functions by sample count (where time is actually spent)."""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"frame": f, "samples": c, "pct": round(100.0 * c / total, 2)} for f, c in leaves.most_common(n)]
+
+    def save(self, path) -> pathlib.Path:
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self.collapsed(), encoding="utf-8")
+        log.info(f"Wrote {self.samples} profile samples to {path}")
+        return path
+
+
+def profile_for(seconds: float, out_dir, interval: float = 0.005) -> dict:
+    """Run the sampling profiler and save collapsed stacks under out_dir."""
+    prof = SamplingProfiler(interval=interval).run(seconds)
+    path = prof.save(pathlib.Path(out_dir) / f"profile-{time.strftime('%Y%m%d-%H%M%S')}.txt")
+    return {"path": str(path), "seconds": seconds, "samples": prof.samples, "top": prof.top()}
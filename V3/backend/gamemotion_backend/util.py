@@ -1,4 +1,4 @@
-import os, json, time, logging, pathlib
+import os, re, json, time, logging, pathlib
 from dotenv import load_dotenv
 
 load_dotenv()  # load variables from .env into os.environ
@@ -12,9 +12,15 @@ def ensure_dirs():
     for d in [CONFIG_DIR, PROFILES_DIR, DATA_DIR, LOGS_DIR]:
         d.mkdir(parents=True, exist_ok=True)
 
+_JSON_TOKENS = re.compile(r'"(?:\\.|[^"\\])*"|//[^\n]*|/\*.*?\*/', re.S)
+
+def strip_json_comments(text):
+    """Remove // and /* */ comments (settings.json is hand-edited); string contents are left alone."""
+    return _JSON_TOKENS.sub(lambda m: m.group(0) if m.group(0)[0] == '"' else "", text)
+
 def load_json(path, default=None):
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
+        return json.loads(strip_json_comments(path.read_text(encoding="utf-8")))
     except Exception:
         return default
 
@@ -6,16 +6,17 @@ import { Card, CardContent } from "@/components/ui/card";
 import { API_BASE } from "@/lib/api";
 
 export function CameraPreview() {
-  const [tick, setTick] = useState(0);
+  const [attempt, setAttempt] = useState(0);
   const [online, setOnline] = useState(true);
 
-  // cache-bust the jpeg every 500ms
+  // the backend pushes each new frame over MJPEG; reconnect if the stream drops
   useEffect(() => {
-    const id = setInterval(() => setTick((t) => (t + 1) % 100000), 500);
-    return () => clearInterval(id);
-  }, []);
+    if (online) return;
+    const id = setTimeout(() => setAttempt((a) => (a + 1) % 100000), 2000);
+    return () => clearTimeout(id);
+  }, [online, attempt]);
 
-  const src = `${API_BASE}/preview.jpg?ts=${Date.now()}&r=${tick}`;
+  const src = `${API_BASE}/preview.mjpg?r=${attempt}`;
 
   return (
     <Card className="bg-muted/10">
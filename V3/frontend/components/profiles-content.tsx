@@ -21,6 +21,7 @@ interface ProfileAction {
   type: "keyboard" | "mouse"
   keys: string[]
   hold_ms: number
+  mode?: "tap" | "hold"
 }
 
 export function ProfilesContent() {
@@ -46,6 +47,7 @@ export function ProfilesContent() {
         type: config.type,
         keys: config.keys,
         hold_ms: config.hold_ms,
+        mode: config.mode,
       }))
       setActions(actionsList)
       setHasUnsavedChanges(false)
@@ -115,6 +117,7 @@ export function ProfilesContent() {
               type: action.type,
               keys: action.keys,
               hold_ms: action.hold_ms,
+              ...(action.mode ? { mode: action.mode } : {}),
             },
           }),
           {},